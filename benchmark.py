@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import synthetic_data
+
+# =============================================================================
+# Rerun benchmark for both dashboards
+# =============================================================================
+# Each measurement runs in a fresh process that drives the app headlessly with
+# Streamlit's AppTest, so the cold start and the peak RSS belong to that run
+# alone. Example:
+#   python benchmark.py --sizes 10k 1M --output bench.json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIZES = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+APPS = ["scratch_20.py", "scratch_19.py"]
+TIMEOUT = 1800
+
+
+def _timed(at):
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed
+
+
+def drive_exam_app(at):
+    """Cold start, then one change per sidebar filter of scratch_20.py."""
+    timings = {"start": _timed(at)}
+    # A broad query: ranking many matches is the slow case of the search.
+    at.sidebar.text_input[0].set_value("skola")
+    timings["search"] = _timed(at)
+
+    school = at.sidebar.selectbox[1]
+    school.set_value(school.options[-1])
+    timings["school"] = _timed(at)
+
+    years = at.sidebar.selectbox[2]
+    years.set_value(years.options[0])
+    timings["year"] = _timed(at)
+
+    exam = at.sidebar.selectbox[4]
+    exam.set_value(exam.options[-1])
+    timings["exam"] = _timed(at)
+
+    level = at.sidebar.selectbox[3]
+    level.set_value(level.options[-1])
+    timings["level"] = _timed(at)
+    return timings
+
+
+def drive_school_panel(at):
+    """Cold start, school switch and the exam controls of scratch_19.py."""
+    timings = {"start": _timed(at)}
+    school = at.selectbox[0]
+    school.set_value(school.options[-1])
+    timings["school"] = _timed(at)
+
+    # AppTest does not report the open tab back, so with lazy tabs the
+    # exam tab is selected through its key before every run.
+    at.session_state["cilne"] = "Eksāmeni"
+    timings["exam_tab"] = _timed(at)
+
+    at.radio[0].set_value("Diagnostikas darbi")
+    at.session_state["cilne"] = "Eksāmeni"
+    timings["exam_type"] = _timed(at)
+
+    subject = at.selectbox[-1]
+    subject.set_value(subject.options[-1])
+    at.session_state["cilne"] = "Eksāmeni"
+    timings["subject"] = _timed(at)
+    return timings
+
+
+def peak_rss_mb():
+    # VmHWM is reset by exec, unlike ru_maxrss which a child inherits from
+    # the (possibly large) benchmark process that started it.
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(app):
+    """Drive one app in this process and print timings and peak RSS as JSON."""
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, HERE)
+    at = AppTest.from_file(os.path.join(HERE, app), default_timeout=TIMEOUT)
+    drive = drive_exam_app if app == "scratch_20.py" else drive_school_panel
+    timings = drive(at)
+    print(json.dumps({"timings": timings, "peak_mb": peak_rss_mb()}))
+
+
+def measure(app, csv_path, snapshot_dir):
+    env = dict(os.environ,
+               EXAM_CSV_SOURCE=csv_path,
+               EXAM_SNAPSHOT_DIR=snapshot_dir,
+               EXAM_GEOCODER="none",
+               EXAM_GEOCODE_DB=os.path.join(snapshot_dir, "geocode.sqlite"))
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", app],
+                         env=env, capture_output=True, text=True, timeout=TIMEOUT)
+    if out.returncode != 0:
+        raise RuntimeError(f"{app} failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(sizes, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    for label in sizes:
+        csv_path = os.path.join(data_dir, f"viis-{label}.csv")
+        if not os.path.exists(csv_path):
+            print(f"generating {label} rows -> {csv_path}", file=sys.stderr)
+            synthetic_data.write_csv(csv_path, SIZES[label])
+
+        snapshot_dir = os.path.join(data_dir, f"snapshots-{label}")
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        for app in APPS:
+            # "cold" builds the snapshot from the CSV, "warm" reuses it.
+            for phase in ("cold", "warm"):
+                result = measure(app, csv_path, snapshot_dir)
+                result.update(app=app, size=label, phase=phase)
+                results.append(result)
+                print_result(result)
+    return results
+
+
+def print_result(result):
+    timings = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in result["timings"].items())
+    print(f"{result['app']:<14} {result['size']:>4} {result['phase']:<4} "
+          f"peak={result['peak_mb']:.0f}MB {timings}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dashboard reruns on synthetic data.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--data-dir", default=os.path.join(HERE, ".bench_data"))
+    parser.add_argument("--output", help="write all results to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+    else:
+        results = run(args.sizes, args.data_dir)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as fh:
+                json.dump(results, fh, indent=2)
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+# =============================================================================
+# Chart spec cache
+# =============================================================================
+# Building an Altair chart and serializing it (schema validation + JSON) is a
+# large share of a rerun. Charts are keyed by everything they depend on
+# (school, tab, class, subject, theme, data version, ...), and the serialized
+# Vega-Lite JSON is kept in a bounded LRU shared by all sessions.
+#
+# Every chart of both apps goes through here, so this is also where the size
+# of what reaches the browser is bounded: charts are built from aggregated
+# frames (bin counts, yearly values), and a chart whose data exceeds
+# CHART_MAX_ROWS rows is not sent at all. It is logged as a warning on the
+# "dashboard.charts" logger, only its row count is cached, and a notice is
+# shown in its place. Altair's own check (5000 rows per frame, a process-wide
+# setting left untouched) still applies, so CHART_MAX_ROWS can only lower it.
+
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "512"))
+CHART_MAX_ROWS = int(os.environ.get("CHART_MAX_ROWS", "5000"))
+
+logger = logging.getLogger("dashboard.charts")
+
+CHART_PARTS = ["layer", "hconcat", "vconcat", "concat"]
+
+
+def _charts(chart):
+    """chart and every layered or concatenated chart inside it."""
+    yield chart
+    for part in CHART_PARTS:
+        children = getattr(chart, part, None)
+        if isinstance(children, list):
+            for child in children:
+                yield from _charts(child)
+
+
+def chart_rows(chart):
+    """Number of data rows in the frames of an Altair chart (each frame once)."""
+    frames = {id(c.data): c.data for c in _charts(chart) if isinstance(getattr(c, "data", None), pd.DataFrame)}
+    return sum(len(frame) for frame in frames.values())
+
+
+class ChartSpecCache:
+    """Bounded LRU of serialized Vega-Lite specs."""
+
+    def __init__(self, maxsize=CHART_CACHE_SIZE, max_rows=CHART_MAX_ROWS):
+        self.maxsize = maxsize
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.oversized = 0
+        self._specs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._specs)
+
+    def get(self, key, build):
+        """Return (spec JSON, data rows) for key, calling build() on a miss.
+
+        The spec is None for a chart over max_rows, which is never drawn.
+        """
+        with self._lock:
+            entry = self._specs.get(key)
+            if entry is not None:
+                self._specs.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Build outside the lock; two sessions racing on one key both build it.
+        # An oversized chart is counted from its frames and never serialized.
+        chart = build()
+        rows = chart_rows(chart)
+        spec = None
+        if rows <= self.max_rows:
+            try:
+                spec = json.dumps(chart.to_dict())
+            except alt.MaxRowsError:
+                pass
+        if spec is None:
+            self.oversized += 1
+            logger.warning(json.dumps({"chart": [str(part) for part in key], "rows": rows,
+                                       "max_rows": self.max_rows}, ensure_ascii=False))
+        entry = (spec, rows)
+        with self._lock:
+            self._specs[key] = entry
+            self._specs.move_to_end(key)
+            while len(self._specs) > self.maxsize:
+                self._specs.popitem(last=False)
+        return entry
+
+    def show(self, key, build, container=st):
+        spec, rows = self.get(key, build)
+        if spec is None:
+            container.warning(f"Diagrammā būtu {rows} datu rindas (atļautas {self.max_rows}), tāpēc tā netiek rādīta.")
+            return
+        # Streamlit moves the data out of the spec it is given, so every
+        # render gets its own freshly parsed copy.
+        container.vega_lite_chart(json.loads(spec), width="stretch")
+
+
+@st.cache_resource
+def get_chart_cache():
+    return ChartSpecCache()
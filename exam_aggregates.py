@@ -0,0 +1,334 @@
+import numpy as np
+import pandas as pd
+
+import exam_data
+
+# =============================================================================
+# Result bins: 0-5, 5-10, ..., 95-100 (left-closed, the last one closed)
+# =============================================================================
+# Counts are kept per 1% base bin; any binning with integer edges (the
+# default 5%, another width, or custom cut points such as pass thresholds)
+# is a merge of those base counts, never a new pass over the rows.
+BASE_BINS = list(range(0, 101))
+BIN_WIDTHS = [1, 2, 5, 10]
+BINS = list(range(0, 105, 5))
+
+SCHOOL_KEYS = ["Mācību gads", "Exam", "Iestādes nosaukums", "Izglītības līmenis"]
+COUNTRY_KEYS = ["Mācību gads", "Exam"]
+
+
+def bin_codes(percent, bins=BINS):
+    """Return the bin index of every value, or -1 if it falls outside bins.
+
+    Each bin is [low, high) as in pd.cut(percent, bins, right=False), except
+    that the top edge (a 100% result) belongs to the last bin. Missing values
+    are not counted.
+    """
+    values = np.asarray(percent, dtype=float)
+    codes = np.searchsorted(bins, values, side="right") - 1
+    codes[values == bins[-1]] = len(bins) - 2
+    codes[codes >= len(bins) - 1] = -1
+    return codes
+
+
+def width_bins(width):
+    """Edges of equal bins of width percent over 0-100."""
+    return list(range(0, 100 + width, width))
+
+
+def parse_bins(text):
+    """Bin edges from custom cut points, e.g. "0, 40, 60, 80, 100".
+
+    Edges must be whole percentages in 0-100, strictly increasing, and at
+    least two; raises ValueError otherwise.
+    """
+    try:
+        edges = [int(part) for part in text.replace(";", ",").split(",") if part.strip()]
+    except ValueError:
+        raise ValueError("Robežpunktiem jābūt veseliem skaitļiem, atdalītiem ar komatu.") from None
+    if len(edges) < 2 or edges[0] < 0 or edges[-1] > 100 or np.any(np.diff(edges) <= 0):
+        raise ValueError("Vajag vismaz divus augošus robežpunktus no 0 līdz 100.")
+    return edges
+
+
+def bin_labels(bins=BINS):
+    return [f"{bins[i]}-{bins[i+1]}" for i in range(len(bins) - 1)]
+
+
+BIN_LABELS = bin_labels(BINS)
+
+
+def rebin(counts, bins=BINS):
+    """Merge 1% base counts (along the last axis) into bins with integer edges.
+
+    Results below the first or from the last edge up are left out, except a
+    100% result, which is in the last bin when that ends at 100.
+    """
+    edges = np.asarray(bins)
+    return np.add.reduceat(counts[..., :edges[-1]], edges[:-1], axis=-1)
+
+
+# =============================================================================
+# Histogram cube: bin counts per (year, exam, school, level) and per country
+# =============================================================================
+class HistogramCube:
+    """Precomputed 1% bin counts so a chart is an index lookup, not a scan.
+
+    Every lookup takes bins (default BINS) and merges the base counts into
+    them with rebin.
+    """
+
+    def __init__(self, school_index, school_values, country_index, country_values):
+        self.school_index = school_index
+        self.school_values = school_values
+        self.country_index = country_index
+        self.country_values = country_values
+
+    @classmethod
+    def build(cls, df):
+        frame = df[SCHOOL_KEYS].copy()
+        frame["bin"] = bin_codes(df["Procenti"], BASE_BINS)
+        frame = frame[frame["bin"] >= 0]
+        return cls(*_count_bins(frame, SCHOOL_KEYS), *_count_bins(frame, COUNTRY_KEYS))
+
+    def school(self, year, exam, school, level, bins=BINS):
+        return rebin(_lookup(self.school_index, self.school_values, (year, exam, school, level)), bins)
+
+    def country(self, year, exam, bins=BINS):
+        return rebin(_lookup(self.country_index, self.country_values, (year, exam)), bins)
+
+    def schools(self, year, exam, schools, level, bins=BINS):
+        """Bin counts of many schools at once, one row per school.
+
+        A single vectorized index lookup, so comparing 50+ schools costs
+        about as much as one; schools without results get a row of zeros.
+        """
+        counts = np.zeros((len(schools), self.school_values.shape[1]), dtype=self.school_values.dtype)
+        if len(schools):
+            keys = pd.MultiIndex.from_tuples([(year, exam, school, level) for school in schools])
+            positions = self.school_index.get_indexer(keys)
+            found = positions >= 0
+            counts[found] = self.school_values[positions[found]]
+        return rebin(counts, bins)
+
+
+# =============================================================================
+# National ranking: per (year, exam, school, level) results and percentile
+# =============================================================================
+RANK_KEYS = ["Mācību gads", "Exam", "Izglītības līmenis"]
+
+
+class RankingTable:
+    """Mean, median and count of every school's results, ranked nationally.
+
+    Schools are ranked by mean result among all schools with the same exam,
+    year and education level. percentile is the share of those schools with
+    a mean at or below this one; rank 1 is the best mean.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @classmethod
+    def build(cls, df):
+        results = df.groupby(SCHOOL_KEYS, observed=True)["Procenti"]
+        table = results.agg(["mean", "median", "count"])
+        table = table[table["count"] > 0]
+        peers = table.groupby(level=RANK_KEYS, observed=True)["mean"]
+        table["percentile"] = peers.rank(pct=True, method="max") * 100
+        table["rank"] = peers.rank(ascending=False, method="min").astype(int)
+        table["schools"] = peers.transform("size")
+        return cls(table)
+
+    def school(self, year, exam, school, level):
+        """The school's row as a dict, or None if it has no results."""
+        try:
+            row = self.table.loc[(year, exam, school, level)]
+        except KeyError:
+            return None
+        return row.to_dict()
+
+
+# =============================================================================
+# Trends: per (school, level, exam series, year) and per (level, exam series, year)
+# =============================================================================
+class TrendTable:
+    """Mean, median and count of results per year, for school and country.
+
+    Exams are keyed by exam_data.exam_series, so an exam whose display name
+    changed in 2022 is still one line across all years.
+    """
+
+    def __init__(self, school_trends, country_trends):
+        self.school_trends = school_trends
+        self.country_trends = country_trends
+
+    @classmethod
+    def build(cls, df):
+        frame = df[["Iestādes nosaukums", "Izglītības līmenis", "Mācību gads", "Procenti"]].copy()
+        frame["series"] = exam_data.exam_series(df["Exam"])
+        results = ["mean", "median", "count"]
+        school_trends = frame.groupby(["Iestādes nosaukums", "Izglītības līmenis", "series", "Mācību gads"],
+                                      observed=True)["Procenti"].agg(results)
+        country_trends = frame.groupby(["Izglītības līmenis", "series", "Mācību gads"],
+                                       observed=True)["Procenti"].agg(results)
+        return cls(school_trends[school_trends["count"] > 0], country_trends[country_trends["count"] > 0])
+
+    def school(self, school, level, exam):
+        """Yearly results of the school for exam (any year's name of it)."""
+        return _years(self.school_trends, (school, level, exam_data.exam_series_name(exam)))
+
+    def country(self, level, exam):
+        """Yearly national results for exam at one education level."""
+        return _years(self.country_trends, (level, exam_data.exam_series_name(exam)))
+
+
+def _years(trends, key):
+    try:
+        return trends.loc[key]
+    except KeyError:
+        return trends.iloc[:0].droplevel(list(range(len(key))))
+
+
+# =============================================================================
+# Sorted results: summary statistics and density curves from sorted slices
+# =============================================================================
+DENSITY_GRID = np.arange(0, 101)
+
+
+class ResultDistribution:
+    """Procenti sorted within every school group and every (year, exam).
+
+    Each group is a contiguous slice of one sorted array, so quartiles are
+    read off by position and a density curve needs one searchsorted.
+    """
+
+    def __init__(self, school_values, school_slices, country_values, country_slices):
+        self.school_values = school_values
+        self.school_slices = school_slices
+        self.country_values = country_values
+        self.country_slices = country_slices
+        self._school_bounds = school_slices.to_numpy()
+        self._country_bounds = country_slices.to_numpy()
+
+    @classmethod
+    def build(cls, df):
+        frame = df[SCHOOL_KEYS + ["Procenti"]].dropna()
+        school_values, school_slices = _sorted_groups(frame, SCHOOL_KEYS)
+        country_values, country_slices = _sorted_groups(frame, COUNTRY_KEYS)
+        return cls(school_values, school_slices, country_values, country_slices)
+
+    def school(self, year, exam, school, level):
+        """Sorted results of one school selection (empty if none)."""
+        return _slice(self.school_values, self.school_slices, self._school_bounds, (year, exam, school, level))
+
+    def country(self, year, exam):
+        return _slice(self.country_values, self.country_slices, self._country_bounds, (year, exam))
+
+
+def _sorted_groups(frame, keys):
+    ordered = frame.sort_values(keys + ["Procenti"])
+    sizes = ordered.groupby(keys, observed=True, sort=True).size()
+    stops = sizes.cumsum()
+    slices = pd.DataFrame({"start": stops - sizes, "stop": stops})
+    return ordered["Procenti"].to_numpy(), slices
+
+
+def _slice(values, slices, bounds, key):
+    try:
+        start, stop = bounds[slices.index.get_loc(key)]
+    except KeyError:
+        return values[:0]
+    return values[start:stop]
+
+
+def _sorted_quantile(values, q):
+    # Linear interpolation between order statistics, as np.quantile does.
+    position = q * (len(values) - 1)
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return float(values[low] + (values[high] - values[low]) * (position - low))
+
+
+def summary_stats(values):
+    """Count, mean, standard deviation and quartiles of sorted values."""
+    if len(values) == 0:
+        return None
+    values = np.asarray(values, dtype=float)
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+        "q1": _sorted_quantile(values, 0.25),
+        "median": _sorted_quantile(values, 0.5),
+        "q3": _sorted_quantile(values, 0.75),
+    }
+
+
+def density_curve(values, grid=DENSITY_GRID):
+    """Gaussian kernel density of sorted values on grid (Scott's bandwidth).
+
+    The values are counted at the grid's 1% resolution with one searchsorted
+    and the kernel is applied to those counts, so the cost does not grow
+    with the number of results.
+    """
+    if len(values) == 0:
+        return np.zeros(len(grid))
+    edges = np.append(grid - 0.5, grid[-1] + 0.5)
+    counts = np.diff(np.searchsorted(values, edges, side="left"))
+    std = float(np.std(values, ddof=1)) if len(values) > 1 else 0.0
+    bandwidth = max(1.06 * std * len(values) ** -0.2, 1.0)
+    distance = (grid[:, None] - grid[None, :]) / bandwidth
+    kernel = np.exp(-0.5 * distance ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    return kernel @ counts / counts.sum() if counts.sum() else np.zeros(len(grid))
+
+
+def _count_bins(frame, keys):
+    # One grouped pass: number the groups, then a single bincount over
+    # group * n_bins + bin gives every group's histogram at once. Returns the
+    # group keys and a (groups, base bins) array of counts.
+    n_bins = len(BASE_BINS) - 1
+    grouped = frame.groupby(keys, observed=True, sort=True)
+    groups = grouped.ngroup()
+    index = grouped.size().index
+    # Rows with a missing key belong to no group (ngroup gives NaN).
+    valid = groups.notna().to_numpy()
+    codes = groups.to_numpy()[valid].astype(np.int64) * n_bins + frame["bin"].to_numpy()[valid]
+    flat = np.bincount(codes, minlength=len(index) * n_bins)
+    return index, flat.reshape(len(index), n_bins).astype(np.int32)
+
+
+def _lookup(index, values, key):
+    try:
+        return values[index.get_loc(key)]
+    except KeyError:
+        return np.zeros(values.shape[1], dtype=values.dtype)
+
+
+def distribution_frame(counts, group, bins=BINS):
+    """Chart rows for one group: bin label, normalized frequency and count."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normalized = counts / counts.sum()
+    return pd.DataFrame({
+        'Exam_Percentage_Bin': bin_labels(bins),
+        'Normalized_Frequency': normalized,
+        'Raw_Count': counts,
+        'Group': group
+    })
+
+
+def comparison_frame(counts, groups, bins=BINS):
+    """Chart rows for many groups: like distribution_frame, stacked.
+
+    counts has one row of bin counts per group.
+    """
+    counts = np.asarray(counts)
+    labels = bin_labels(bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normalized = counts / counts.sum(axis=1, keepdims=True)
+    return pd.DataFrame({
+        'Exam_Percentage_Bin': np.tile(labels, len(groups)),
+        'Normalized_Frequency': normalized.ravel(),
+        'Raw_Count': counts.ravel(),
+        'Group': np.repeat(list(groups), len(labels))
+    })
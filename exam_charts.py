@@ -0,0 +1,181 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+
+import exam_aggregates
+
+# =============================================================================
+# Exam analysis charts
+# =============================================================================
+# Chart builders shared by the dashboard (scratch_20.py) and the batch report
+# export (export_reports.py). Each takes the precomputed aggregates and a
+# selection and returns a configured Altair chart.
+
+
+def build_histogram_chart(histograms, year, exam, school, level, bins=exam_aggregates.BINS):
+    # School and country bin counts come from the precomputed histogram cube,
+    # merged into bins (5% by default).
+    school_counts = histograms.school(year, exam, school, level, bins)
+    school_df = exam_aggregates.distribution_frame(school_counts, 'School', bins)
+
+    country_counts = histograms.country(year, exam, bins)
+    if country_counts.sum() == 0:
+        country_df = pd.DataFrame(columns=['Exam_Percentage_Bin', 'Normalized_Frequency', 'Group', 'Raw_Count'])
+    else:
+        country_df = exam_aggregates.distribution_frame(country_counts, 'Country', bins)
+
+    # Combine the two dataframes.
+    combined_df = pd.concat([school_df, country_df], ignore_index=True)
+
+    # Create the grouped bar chart with enlarged fonts.
+    return alt.Chart(combined_df).mark_bar().encode(
+        x=alt.X('Exam_Percentage_Bin:N', title='Intervāls', sort=exam_aggregates.bin_labels(bins)),
+        xOffset=alt.X('Group:N', title=''),
+        y=alt.Y('Normalized_Frequency:Q', title='Biežums, %', axis=alt.Axis(format='%')),
+        color=alt.Color('Group:N',
+                        scale=alt.Scale(domain=['School', 'Country'],
+                                        range=['blue', 'orange'])),
+        tooltip=[
+            alt.Tooltip('Group:N', title='Grupa'),
+            alt.Tooltip('Exam_Percentage_Bin:N', title='Rezultātu intervāls, %'),
+            alt.Tooltip('Normalized_Frequency:Q', format='.2%', title='Biežums, %'),
+            alt.Tooltip('Raw_Count:Q', title='Kārtotāju skaits')
+        ]
+    ).properties(
+        width=350,
+        height=400,
+        title="Eksāmena rezultāti - skola vs. valsts vidējais"
+    ).configure_axis(
+        labelFontSize=16,
+        titleFontSize=18
+    ).configure_title(
+        fontSize=20
+    )
+
+
+def summary_frame(distributions, year, exam, school, level):
+    # Median, quartiles, mean and spread for the school and the country.
+    rows = {}
+    for group, values in [('Skola', distributions.school(year, exam, school, level)),
+                          ('Valsts', distributions.country(year, exam))]:
+        stats = exam_aggregates.summary_stats(values)
+        if stats is not None:
+            rows[group] = stats
+    summary = pd.DataFrame.from_dict(rows, orient='index')
+    return summary.rename(columns={
+        'count': 'Kārtotāji', 'mean': 'Vidējais', 'std': 'Standartnovirze',
+        'q1': '1. kvartile', 'median': 'Mediāna', 'q3': '3. kvartile'
+    })
+
+
+def build_density_chart(distributions, year, exam, school, level):
+    grid = exam_aggregates.DENSITY_GRID
+    density_df = pd.concat([
+        pd.DataFrame({'Procenti': grid,
+                      'Blīvums': exam_aggregates.density_curve(values),
+                      'Group': group})
+        for group, values in [('School', distributions.school(year, exam, school, level)),
+                              ('Country', distributions.country(year, exam))]
+        if len(values)
+    ], ignore_index=True)
+
+    return alt.Chart(density_df).mark_line().encode(
+        x=alt.X('Procenti:Q', title='Rezultāts, %', scale=alt.Scale(domain=[0, 100])),
+        y=alt.Y('Blīvums:Q', title='Blīvums'),
+        color=alt.Color('Group:N',
+                        scale=alt.Scale(domain=['School', 'Country'],
+                                        range=['blue', 'orange'])),
+        tooltip=[
+            alt.Tooltip('Group:N', title='Grupa'),
+            alt.Tooltip('Procenti:Q', title='Rezultāts, %'),
+            alt.Tooltip('Blīvums:Q', format='.4f', title='Blīvums')
+        ]
+    ).properties(
+        width=350,
+        height=250,
+        title="Rezultātu blīvuma līkne"
+    ).configure_axis(
+        labelFontSize=16,
+        titleFontSize=18
+    ).configure_title(
+        fontSize=20
+    )
+
+
+def build_trend_chart(trends, exam, school, level):
+    # Mean and median per year; the exam is followed across its 2022 rename.
+    frames = []
+    for group, yearly in [('School', trends.school(school, level, exam)), ('Country', trends.country(level, exam))]:
+        yearly = yearly[['mean', 'median']].rename(columns={'mean': 'Vidējais', 'median': 'Mediāna'})
+        yearly = yearly.rename_axis('Gads').reset_index().melt(
+            id_vars='Gads', var_name='Rādītājs', value_name='Rezultāts')
+        yearly['Group'] = group
+        frames.append(yearly)
+    trend_df = pd.concat(frames, ignore_index=True)
+
+    return alt.Chart(trend_df).mark_line(point=True).encode(
+        x=alt.X('Gads:O', title='Mācību gads'),
+        y=alt.Y('Rezultāts:Q', title='Rezultāts, %', scale=alt.Scale(domain=[0, 100])),
+        color=alt.Color('Group:N',
+                        scale=alt.Scale(domain=['School', 'Country'],
+                                        range=['blue', 'orange'])),
+        strokeDash=alt.StrokeDash('Rādītājs:N', title='Rādītājs'),
+        tooltip=[
+            alt.Tooltip('Group:N', title='Grupa'),
+            alt.Tooltip('Gads:O', title='Mācību gads'),
+            alt.Tooltip('Rādītājs:N', title='Rādītājs'),
+            alt.Tooltip('Rezultāts:Q', format='.1f', title='Rezultāts, %')
+        ]
+    ).properties(
+        width=350,
+        height=300,
+        title="Rezultātu dinamika pa gadiem"
+    ).configure_axis(
+        labelFontSize=16,
+        titleFontSize=18
+    ).configure_title(
+        fontSize=20
+    )
+
+
+def build_comparison_chart(histograms, year, exam, schools, level, max_offset_groups=6,
+                           bins=exam_aggregates.BINS):
+    # All schools' bin counts in one lookup, with the country as last group.
+    counts = histograms.schools(year, exam, schools, level, bins)
+    counts = np.vstack([counts, histograms.country(year, exam, bins)])
+    groups = list(schools) + ['Valsts']
+    comparison_df = exam_aggregates.comparison_frame(counts, groups, bins)
+    labels = exam_aggregates.bin_labels(bins)
+
+    tooltip = [
+        alt.Tooltip('Group:N', title='Grupa'),
+        alt.Tooltip('Exam_Percentage_Bin:N', title='Rezultātu intervāls, %'),
+        alt.Tooltip('Normalized_Frequency:Q', format='.2%', title='Biežums, %'),
+        alt.Tooltip('Raw_Count:Q', title='Kārtotāju skaits')
+    ]
+    if len(groups) <= max_offset_groups:
+        # A few schools: grouped bars, like the school vs. country chart.
+        chart = alt.Chart(comparison_df).mark_bar().encode(
+            x=alt.X('Exam_Percentage_Bin:N', title='Intervāls', sort=labels),
+            xOffset=alt.X('Group:N', title='', sort=groups),
+            y=alt.Y('Normalized_Frequency:Q', title='Biežums, %', axis=alt.Axis(format='%')),
+            color=alt.Color('Group:N', title='Skola', sort=groups),
+            tooltip=tooltip
+        ).properties(width=350, height=400)
+    else:
+        # Many schools: one heatmap row per school stays readable at 50+.
+        chart = alt.Chart(comparison_df).mark_rect().encode(
+            x=alt.X('Exam_Percentage_Bin:N', title='Intervāls', sort=labels),
+            y=alt.Y('Group:N', title='', sort=groups),
+            color=alt.Color('Normalized_Frequency:Q', title='Biežums, %', legend=alt.Legend(format='%')),
+            tooltip=tooltip
+        ).properties(width=350, height=alt.Step(18))
+
+    return chart.properties(
+        title="Eksāmena rezultāti - salīdzinājums ar citām skolām"
+    ).configure_axis(
+        labelFontSize=16,
+        titleFontSize=18
+    ).configure_title(
+        fontSize=20
+    )
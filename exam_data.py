@@ -0,0 +1,531 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# =============================================================================
+# Data source and local snapshot settings
+# =============================================================================
+# The VIIS export is published as a CSV on Dropbox. It can be overridden with a
+# local path (offline use, tests) through the EXAM_CSV_SOURCE variable.
+DEFAULT_SOURCE = "https://www.dropbox.com/scl/fi/o7j7q5hlq9i04s9tcvj8q/Web-Intelligence-1.csv?rlkey=e05vhykdwv6zrprmx1i5n4fml&dl=1"
+SOURCE = os.environ.get("EXAM_CSV_SOURCE", DEFAULT_SOURCE)
+SNAPSHOT_DIR = os.environ.get("EXAM_SNAPSHOT_DIR", ".exam_snapshots")
+
+# Bump whenever the snapshot layout changes so stale files are not reused.
+SNAPSHOT_FORMAT = 7
+
+EXAM_TYPE = "Centralizēts eksāmens"
+EXAM_PREFIX = "Centralizētais eksāmens "
+CHUNK_SIZE = 1 << 20
+
+# Set EXAM_CSV_CHUNK_ROWS to stream large exports into the snapshot in chunks
+# of that many rows, so peak memory depends on the chunk, not the file.
+CSV_CHUNK_ROWS = int(os.environ.get("EXAM_CSV_CHUNK_ROWS", "0")) or None
+
+# Columns read from the CSV; everything else in the export is skipped.
+CSV_COLUMNS = [
+    "Iestādes nosaukums",
+    "Iestādes juridiskās adrese",
+    "Mācību gads",
+    "Pārbaudījuma tips",
+    "Pārbaudījuma nosaukums",
+    "Pārbaudījuma mācību priekšmeta nosaukums",
+    "Klases pakāpe",
+    "Procenti",
+]
+
+# Long, highly repetitive text columns stored as categoricals.
+CATEGORY_COLUMNS = [
+    "Iestādes nosaukums",
+    "Iestādes juridiskās adrese",
+    "Pārbaudījuma tips",
+    "Pārbaudījuma nosaukums",
+    "Pārbaudījuma mācību priekšmeta nosaukums",
+    "Exam",
+    "Izglītības līmenis",
+]
+# Numeric columns and the smallest dtype that holds them (NaN allowed).
+NUMERIC_COLUMNS = {"Procenti": "float32", "Klases pakāpe": "float32"}
+# CSV columns read as text, so that a chunk where one is all empty still has
+# strings (not a float NaN column) in it.
+TEXT_COLUMNS = [column for column in CSV_COLUMNS if column in CATEGORY_COLUMNS]
+
+# One schema for every chunk of a snapshot, whatever the first chunk held.
+SNAPSHOT_SCHEMA = pa.schema(
+    [("Mācību gads", pa.int16())]
+    + [(column, pa.float32()) for column in NUMERIC_COLUMNS]
+    + [(column, pa.dictionary(pa.int32(), pa.string())) for column in CATEGORY_COLUMNS]
+)
+
+logger = logging.getLogger(__name__)
+
+# Education levels: "Pamatskola" includes classes 1-9, "Vidusskola" 10-12.
+GRADE_BANDS = {"Pamatskola": (1, 9), "Vidusskola": (10, 12)}
+
+
+def is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _meta_path(snapshot_dir):
+    return os.path.join(snapshot_dir, "source.json")
+
+
+def _read_meta(snapshot_dir):
+    try:
+        with open(_meta_path(snapshot_dir), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _temp_path(path):
+    """A new temporary file next to path, unique to this writer.
+
+    Replicas that start together build the same files at once; each writes
+    its own temporary file and os.replace()s it into place.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    os.close(fd)
+    return tmp_path
+
+
+def _write_json(path, data):
+    tmp_path = _temp_path(path)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def snapshot_path(version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"exams-v{SNAPSHOT_FORMAT}-{version}.parquet")
+
+
+# =============================================================================
+# Fetching: resolve the source to a local CSV and a content version
+# =============================================================================
+def _download(source, snapshot_dir, meta):
+    """Download the CSV, returning (csv_path, version, etag).
+
+    csv_path is None when the server answered 304 Not Modified for the ETag
+    remembered from the previous download.
+    """
+    request = urllib.request.Request(source, headers={"User-Agent": "exam_dashboard"})
+    if (meta.get("source") == source and meta.get("etag")
+            and os.path.exists(snapshot_path(meta["version"], snapshot_dir))):
+        request.add_header("If-None-Match", meta["etag"])
+    try:
+        response = urllib.request.urlopen(request, timeout=60)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, meta["version"], meta["etag"]
+        raise
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".csv", dir=snapshot_dir)
+    digest = hashlib.sha256()
+    try:
+        with response, os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: response.read(CHUNK_SIZE), b""):
+                digest.update(block)
+                out.write(block)
+            expected = response.headers.get("Content-Length")
+            if expected is not None and out.tell() != int(expected):
+                raise OSError(f"download cut off after {out.tell()} of {expected} bytes")
+    except BaseException:
+        # A download cut off halfway must not stay behind in snapshot_dir.
+        _remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest()[:16], response.headers.get("ETag")
+
+
+def resolve_version(source=SOURCE, snapshot_dir=SNAPSHOT_DIR):
+    """Return (csv_path, version, cleanup) for the current state of source.
+
+    csv_path may be None if the snapshot for version is already on disk and the
+    CSV did not need to be downloaded. cleanup tells whether csv_path is a
+    temporary download that the caller should remove.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    if not is_url(source):
+        return source, _hash_file(source), False
+
+    meta = _read_meta(snapshot_dir)
+    try:
+        csv_path, version, etag = _download(source, snapshot_dir, meta)
+    except (urllib.error.URLError, OSError):
+        # Offline or the link is slow/broken: serve the last good snapshot.
+        if meta.get("source") == source and os.path.exists(snapshot_path(meta["version"], snapshot_dir)):
+            return None, meta["version"], False
+        raise
+    _write_json(_meta_path(snapshot_dir), {"source": source, "version": version, "etag": etag})
+    return csv_path, version, csv_path is not None
+
+
+# =============================================================================
+# Derived columns
+# =============================================================================
+def derive_exam_names(df):
+    """Return the display exam name for every row of df.
+
+    Rows with a real "Pārbaudījuma nosaukums" keep it. "N/D" rows fall back to
+    the subject name; before 2022 the subject carries a "Centralizētais
+    eksāmens " prefix that is stripped, and the rest is capitalized.
+    """
+    names = df["Pārbaudījuma nosaukums"]
+    subjects = df["Pārbaudījuma mācību priekšmeta nosaukums"]
+
+    # _clean_exams calls this before validate_exams, so years are still as
+    # read from the CSV here. One that does not parse counts as before 2022;
+    # validate_exams then quarantines its row as bad_year.
+    years = pd.to_numeric(df["Mācību gads"], errors="coerce").fillna(0).to_numpy()
+
+    stripped = subjects.str.removeprefix(EXAM_PREFIX).str.capitalize()
+    fallback = subjects.where(years >= 2022, stripped)
+    return names.where(names != "N/D", fallback)
+
+
+# Level suffix of the 2022+ secondary school exam names.
+EXAM_LEVEL_SUFFIX = " (optimālais līmenis)"
+# Noun and adjective endings (nominative and locative, singular and plural,
+# definite "-ajā(s)"), longest first. Removing them from every word leaves
+# the same stems for "Sociālās zinības" and "sociālajās zinībās".
+INFLECTION_ENDINGS = ["ajās", "ajā", "ās", "ēs", "as", "es", "is", "us", "ā", "ē", "ī", "ū", "a", "e", "s", "š"]
+
+
+def _stem(word):
+    for ending in INFLECTION_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 2:
+            return word[:-len(ending)]
+    return word
+
+
+def exam_series_name(name):
+    """Year-independent key of an exam, for following it across years.
+
+    Before 2022 an exam is named by its subject in the locative ("Centralizētais
+    eksāmens matemātikā", shown as "Matemātikā"); from 2022 on by the subject
+    itself ("Matemātika", "Matemātika (optimālais līmenis)"). All of these give
+    the key "matemātik": the lowercased word stems, not meant for display.
+    """
+    if not isinstance(name, str):
+        return name
+    name = name.removeprefix(EXAM_PREFIX).removesuffix(EXAM_LEVEL_SUFFIX).strip().lower()
+    return " ".join(_stem(word) for word in name.split())
+
+
+def exam_series(names):
+    """exam_series_name for every row, computed once per distinct name."""
+    names = names.astype("category")
+    categories = [exam_series_name(name) for name in names.cat.categories]
+    codes, uniques = pd.factorize(pd.Index(categories, dtype=object))
+    series_codes = np.where(names.cat.codes >= 0, codes[names.cat.codes], -1)
+    return pd.Series(pd.Categorical.from_codes(series_codes, uniques), index=names.index)
+
+
+def grade_bands(df):
+    """Return the education level ("Pamatskola"/"Vidusskola") of every row."""
+    grades = df["Klases pakāpe"].astype(float)
+    conditions = [grades.between(low, high) for low, high in GRADE_BANDS.values()]
+    bands = np.select(conditions, list(GRADE_BANDS), default=None)
+    return pd.Series(bands, index=df.index, dtype=object)
+
+
+# =============================================================================
+# Validation: parse years, grades and percentages once, quarantine bad rows
+# =============================================================================
+YEAR_RANGE = (1990, 2100)
+GRADE_RANGE = (1, 12)
+PERCENT_RANGE = (0, 100)
+QUALITY_CHECKS = ["missing_school", "missing_exam", "bad_year", "bad_grade", "bad_percent"]
+QUARANTINE_MAX_ROWS = 100_000
+
+
+def _whole_in_range(values, bounds):
+    return values.between(*bounds) & (values % 1 == 0)
+
+
+def validate_exams(df):
+    """Return (valid rows, quarantined rows) of a cleaned frame.
+
+    Years, grades and percentages are parsed to numbers in one vectorized
+    pass. A row is quarantined if it has no school or exam, its year is not
+    a whole number in YEAR_RANGE, its grade not a whole number in
+    GRADE_RANGE, or its result outside PERCENT_RANGE (missing included).
+    Quarantined rows get a "problem" column naming the first failed check.
+    """
+    years = pd.to_numeric(df["Mācību gads"], errors="coerce")
+    grades = pd.to_numeric(df["Klases pakāpe"], errors="coerce")
+    percent = pd.to_numeric(df["Procenti"], errors="coerce")
+    failed = [
+        df["Iestādes nosaukums"].isna(),
+        df["Exam"].isna(),
+        ~_whole_in_range(years, YEAR_RANGE),
+        ~_whole_in_range(grades, GRADE_RANGE),
+        ~percent.between(*PERCENT_RANGE),
+    ]
+    problem = np.select(failed, QUALITY_CHECKS, default="")
+    bad = problem != ""
+
+    # Quarantined rows keep the values as read, so the file shows what was wrong.
+    quarantined = df[bad].assign(problem=problem[bad])
+    df = df.assign(**{"Mācību gads": years, "Klases pakāpe": grades, "Procenti": percent})
+    valid = df[~bad].reset_index(drop=True)
+    valid["Mācību gads"] = valid["Mācību gads"].astype(np.int64)
+    return valid, quarantined
+
+
+class DataQuality:
+    """Checked/quarantined row counts over every chunk of one CSV load."""
+
+    def __init__(self):
+        self.rows = 0
+        self.problems = dict.fromkeys(QUALITY_CHECKS, 0)
+        self._quarantined = []
+        self._kept = 0
+
+    def add(self, checked, quarantined):
+        self.rows += checked
+        for problem, count in quarantined["problem"].value_counts().items():
+            self.problems[problem] += int(count)
+        # Counts are exact; only the first QUARANTINE_MAX_ROWS rows are kept.
+        room = QUARANTINE_MAX_ROWS - self._kept
+        if room > 0 and len(quarantined):
+            self._quarantined.append(quarantined.head(room))
+            self._kept += min(room, len(quarantined))
+
+    def summary(self):
+        return {"rows": self.rows, "quarantined": sum(self.problems.values()), "problems": self.problems}
+
+    def write_quarantine(self, path):
+        if self._quarantined:
+            tmp_path = _temp_path(path)
+            try:
+                pd.concat(self._quarantined, ignore_index=True).to_csv(tmp_path, index=False)
+                os.replace(tmp_path, path)
+            except BaseException:
+                _remove(tmp_path)
+                raise
+
+
+# =============================================================================
+# Parsing and snapshotting
+# =============================================================================
+def _clean_exams(df, quality=None):
+    # Clean column names (remove any leading/trailing spaces)
+    df.columns = df.columns.str.strip()
+
+    # Keep only rows for "Centralizēts eksāmens"
+    df = df[df["Pārbaudījuma tips"] == EXAM_TYPE].reset_index(drop=True)
+
+    df["Exam"] = derive_exam_names(df)
+    checked = len(df)
+    df, quarantined = validate_exams(df)
+    if quality is not None:
+        quality.add(checked, quarantined)
+    df["Izglītības līmenis"] = grade_bands(df)
+    return df
+
+
+def read_exam_csv(path, chunksize=None, quality=None):
+    """Read the needed columns of the centralized exam rows.
+
+    Returns one frame, or with chunksize an iterator of cleaned frames of at
+    most that many rows. Rows failing validate_exams are left out and counted
+    in quality (a DataQuality), if given.
+    """
+    # The export pads some column names, so the text dtypes are keyed by the
+    # names as they appear in the header.
+    header = pd.read_csv(path, nrows=0).columns
+    dtype = {column: str for column in header if column.strip() in TEXT_COLUMNS}
+    reader = pd.read_csv(path, usecols=lambda column: column.strip() in CSV_COLUMNS, dtype=dtype,
+                         chunksize=chunksize)
+    if chunksize is None:
+        return _clean_exams(reader, quality)
+    return (_clean_exams(chunk, quality) for chunk in reader)
+
+
+def memory_footprint(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def compact_exams(df):
+    """Return df with categorical text columns and small numeric dtypes."""
+    df = df.copy()
+    # validate_exams leaves only whole years in YEAR_RANGE.
+    df["Mācību gads"] = df["Mācību gads"].astype("int16")
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column, dtype in NUMERIC_COLUMNS.items():
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype(dtype)
+    return df
+
+
+def _info_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _quarantine_path(path):
+    return os.path.splitext(path)[0] + ".quarantine.csv"
+
+
+def write_snapshot(chunks, path, quality=None):
+    """Compact frames from chunks and append them to the snapshot at path.
+
+    chunks is an iterable of cleaned frames (a list of one for a full read).
+    The memory footprint before/after compaction is recorded next to it,
+    with the data-quality summary and quarantined rows when quality is given.
+    """
+    info = {"rows": 0, "memory_before": 0, "memory_after": 0}
+    tmp_path = _temp_path(path)
+    writer = None
+    try:
+        try:
+            for df in chunks:
+                # A chunk with no centralized exam rows adds nothing.
+                if df.empty:
+                    continue
+                compact = compact_exams(df)
+                info["rows"] += len(df)
+                info["memory_before"] += memory_footprint(df)
+                info["memory_after"] += memory_footprint(compact)
+
+                table = pa.Table.from_pandas(compact, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, SNAPSHOT_SCHEMA)
+                writer.write_table(table.select(SNAPSHOT_SCHEMA.names).cast(SNAPSHOT_SCHEMA))
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ValueError("The CSV file contains no data.")
+
+        logger.info("exam snapshot %s: %d rows, %.1f MB -> %.1f MB in memory",
+                    os.path.basename(path), info["rows"],
+                    info["memory_before"] / 1e6, info["memory_after"] / 1e6)
+        if quality is not None:
+            info["quality"] = quality.summary()
+            quality.write_quarantine(_quarantine_path(path))
+            if info["quality"]["quarantined"]:
+                logger.warning("exam snapshot %s: %d rows quarantined %s", os.path.basename(path),
+                               info["quality"]["quarantined"], info["quality"]["problems"])
+        # The info goes first so a snapshot on disk always has one. If another
+        # process put the same version in place meanwhile, either copy will do.
+        _write_json(_info_path(path), info)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+
+def snapshot_info(version, snapshot_dir=SNAPSHOT_DIR):
+    """Row count and in-memory size (bytes) before/after compaction.
+
+    For chunked ingestion these are sums over the chunks. "quality" holds
+    the validation summary: rows checked, quarantined, and per problem.
+    """
+    try:
+        with open(_info_path(snapshot_path(version, snapshot_dir)), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_exams(source=SOURCE, snapshot_dir=SNAPSHOT_DIR, chunksize=CSV_CHUNK_ROWS):
+    """Load the centralized exam rows, using a local Parquet snapshot.
+
+    The CSV is only parsed when its content hash has no snapshot yet, in
+    chunks of chunksize rows if given. Returns (df, version) where version
+    identifies the snapshot.
+    """
+    csv_path, version, cleanup = resolve_version(source, snapshot_dir)
+    try:
+        path = build_snapshot(csv_path, version, snapshot_dir, chunksize)
+    finally:
+        if cleanup:
+            os.remove(csv_path)
+    return pd.read_parquet(path), version
+
+
+def remove_old_snapshots(version, snapshot_dir=SNAPSHOT_DIR):
+    """Delete the snapshot files of every version older than version's."""
+    keep = snapshot_path(version, snapshot_dir)
+    try:
+        cutoff = os.path.getmtime(keep)
+        names = os.listdir(snapshot_dir)
+    except OSError:
+        return
+    prefix = os.path.splitext(os.path.basename(keep))[0]
+    for name in names:
+        path = os.path.join(snapshot_dir, name)
+        # Only older files: another replica may have just built a newer one.
+        if not name.startswith("exams-v") or name.startswith(prefix):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def build_snapshot(csv_path, version, snapshot_dir=SNAPSHOT_DIR, chunksize=CSV_CHUNK_ROWS):
+    """Return the snapshot path of version, writing it from csv_path if missing."""
+    path = snapshot_path(version, snapshot_dir)
+    if not os.path.exists(path):
+        quality = DataQuality()
+        if chunksize is None:
+            chunks = [read_exam_csv(csv_path, quality=quality)]
+        else:
+            chunks = read_exam_csv(csv_path, chunksize, quality)
+        write_snapshot(chunks, path, quality)
+    return path
+
+
+if __name__ == "__main__":
+    # Build (or reuse) the snapshot and print its memory footprint:
+    #   python exam_data.py [csv path or URL]
+    logging.basicConfig(level=logging.INFO)
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE
+    df, version = load_exams(source)
+    info = snapshot_info(version)
+    print(f"snapshot {version}: {len(df)} rows")
+    if info:
+        print(f"  in memory as loaded from CSV: {info['memory_before'] / 1e6:.1f} MB")
+        print(f"  in memory compacted:          {info['memory_after'] / 1e6:.1f} MB")
+    print(f"  in memory as served:          {memory_footprint(df) / 1e6:.1f} MB")
+    quality = info.get("quality")
+    if quality:
+        print(f"  rows checked: {quality['rows']}, quarantined: {quality['quarantined']}")
+        for problem, count in quality["problems"].items():
+            if count:
+                print(f"    {problem}: {count}")
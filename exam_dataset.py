@@ -0,0 +1,255 @@
+import copy
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import exam_aggregates
+import exam_data
+import exam_index
+
+# =============================================================================
+# The loaded dataset and its background refresh
+# =============================================================================
+# An ExamDataset is one version of the exam data together with every index
+# built from it, and is never modified. DatasetRefresher holds the current
+# one and, every EXAM_REFRESH_SECONDS (0 disables), checks the source in a
+# background thread. A new version is parsed, snapshotted and indexed in that
+# thread, then swapped in with a single assignment: a rerun that fetched the
+# old dataset keeps using it, the next one gets the new one, and no request
+# waits for a reload.
+
+#
+# Shared mode (EXAM_SHARED_DATASET, on by default): each version is also
+# written once to a directory of uncompressed, memory-mappable files next to
+# the snapshot. Every server process on the host maps the same files
+# read-only, so the rows and the large index arrays live in the page cache
+# once instead of once per replica, and sessions only ever get views of them.
+
+REFRESH_SECONDS = int(os.environ.get("EXAM_REFRESH_SECONDS", "600"))
+SHARED_DATASET = os.environ.get("EXAM_SHARED_DATASET", "1").lower() not in ("0", "off", "false")
+DATASET_FORMAT = 4  # bump when the shared directory layout changes
+
+# Large arrays stored as .npy files and mapped, as (file, index, attribute).
+MAPPED_ARRAYS = [
+    ("filter_rows", "filters", "row_order"),
+    ("school_values", "distributions", "school_values"),
+    ("country_values", "distributions", "country_values"),
+    ("school_bins", "histograms", "school_values"),
+    ("country_bins", "histograms", "country_values"),
+]
+INDEXES = ["filters", "histograms", "distributions", "rankings", "trends"]
+
+logger = logging.getLogger(__name__)
+
+
+class ExamDataset:
+    """The exam rows of one version and the aggregates the apps read."""
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.filters = exam_index.FilterIndex(df)
+        self.histograms = exam_aggregates.HistogramCube.build(df)
+        self.distributions = exam_aggregates.ResultDistribution.build(df)
+        self.rankings = exam_aggregates.RankingTable.build(df)
+        self.trends = exam_aggregates.TrendTable.build(df)
+
+    @classmethod
+    def load(cls, source=exam_data.SOURCE, snapshot_dir=exam_data.SNAPSHOT_DIR):
+        csv_path, version, cleanup = exam_data.resolve_version(source, snapshot_dir)
+        try:
+            path = exam_data.build_snapshot(csv_path, version, snapshot_dir)
+        finally:
+            if cleanup:
+                os.remove(csv_path)
+        return cls.from_snapshot(path, version, snapshot_dir)
+
+    @classmethod
+    def from_snapshot(cls, path, version, snapshot_dir=exam_data.SNAPSHOT_DIR):
+        """The dataset of a Parquet snapshot; mapped from its shared files in shared mode."""
+        if not SHARED_DATASET:
+            return cls(pd.read_parquet(path), version)
+        directory = shared_path(version, snapshot_dir)
+        if not os.path.isdir(directory):
+            cls(pd.read_parquet(path), version).save(directory)
+        return cls.open(directory)
+
+    def save(self, directory):
+        """Write the shared files of this dataset (atomically, as a directory)."""
+        parent = os.path.dirname(os.path.abspath(directory))
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".dataset-")
+        try:
+            _write_frame(self.df, os.path.join(tmp_dir, "exams.arrow"))
+
+            indexes = {name: copy.copy(getattr(self, name)) for name in INDEXES}
+            for filename, name, attribute in MAPPED_ARRAYS:
+                np.save(os.path.join(tmp_dir, f"{filename}.npy"), getattr(indexes[name], attribute))
+                setattr(indexes[name], attribute, None)
+            with open(os.path.join(tmp_dir, "indexes.pickle"), "wb") as fh:
+                pickle.dump({"version": self.version, **indexes}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # Another process finished the same version first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
+
+    @classmethod
+    def open(cls, directory):
+        """Map a dataset written by save(): no row is copied into this process."""
+        dataset = cls.__new__(cls)
+        dataset.df = _map_frame(os.path.join(directory, "exams.arrow"))
+        with open(os.path.join(directory, "indexes.pickle"), "rb") as fh:
+            indexes = pickle.load(fh)
+        dataset.version = indexes.pop("version")
+        for filename, name, attribute in MAPPED_ARRAYS:
+            array = np.load(os.path.join(directory, f"{filename}.npy"), mmap_mode="r")
+            setattr(indexes[name], attribute, array)
+        for name, index in indexes.items():
+            setattr(dataset, name, index)
+        return dataset
+
+    def address(self, school):
+        return self.df["Iestādes juridiskās adrese"].iloc[self.filters.first_row(school)]
+
+
+def shared_path(version, snapshot_dir=exam_data.SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"dataset-v{exam_data.SNAPSHOT_FORMAT}.{DATASET_FORMAT}-{version}")
+
+
+def remove_old_versions(version, snapshot_dir=exam_data.SNAPSHOT_DIR):
+    """Delete the snapshots and shared directories of versions before version.
+
+    Replicas still serving an old version keep working: their files stay
+    mapped until they swap, only the names are gone.
+    """
+    exam_data.remove_old_snapshots(version, snapshot_dir)
+    keep = shared_path(version, snapshot_dir)
+    try:
+        cutoff = os.path.getmtime(exam_data.snapshot_path(version, snapshot_dir))
+        names = os.listdir(snapshot_dir)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(snapshot_dir, name)
+        if not name.startswith("dataset-v") or path == keep:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path)
+        except OSError:
+            pass
+
+
+def _write_frame(df, path):
+    # Every column becomes a plain fixed-width array (categoricals as their
+    # codes, categories in the schema metadata), so each one maps back as a
+    # NumPy view without conversion.
+    arrays, categories = {}, {}
+    for name, column in df.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            categories[name] = column.cat.categories.tolist()
+            column = column.cat.codes
+        arrays[name] = pa.array(column.to_numpy(), from_pandas=False)
+    table = pa.table(arrays).replace_schema_metadata({"categories": json.dumps(categories, ensure_ascii=False)})
+    with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _map_frame(path):
+    table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+    categories = json.loads(table.schema.metadata[b"categories"])
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        values = column.chunk(0).to_numpy(zero_copy_only=True)
+        if name in categories:
+            values = pd.Categorical.from_codes(values, categories=categories[name], validate=False)
+        columns[name] = pd.Series(values, name=name, copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+
+class DatasetRefresher:
+    """The current ExamDataset, rebuilt off the request path when the source changes."""
+
+    def __init__(self, source=exam_data.SOURCE, snapshot_dir=exam_data.SNAPSHOT_DIR, interval=REFRESH_SECONDS):
+        self.source = source
+        self.snapshot_dir = snapshot_dir
+        self.interval = interval
+        self._dataset = None
+        self._source_stat = self._stat()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        """The latest dataset; only the very first call waits for a load."""
+        dataset = self._dataset
+        if dataset is None:
+            with self._lock:
+                if self._dataset is None:
+                    self._dataset = ExamDataset.load(self.source, self.snapshot_dir)
+                    remove_old_versions(self._dataset.version, self.snapshot_dir)
+                dataset = self._dataset
+        return dataset
+
+    def _stat(self):
+        # Size and mtime of a local source, so an untouched file is not
+        # re-hashed on every check; URLs are checked with their ETag instead.
+        if exam_data.is_url(self.source):
+            return None
+        try:
+            info = os.stat(self.source)
+        except OSError:
+            return None
+        return info.st_size, info.st_mtime_ns
+
+    def refresh(self):
+        """Check the source once and swap in a new dataset if it changed."""
+        with self._lock:
+            stat = self._stat()
+            if stat is not None and stat == self._source_stat and self._dataset is not None:
+                return False
+            csv_path, version, cleanup = exam_data.resolve_version(self.source, self.snapshot_dir)
+            try:
+                if self._dataset is not None and version == self._dataset.version:
+                    self._source_stat = stat
+                    return False
+                path = exam_data.build_snapshot(csv_path, version, self.snapshot_dir)
+            finally:
+                if cleanup:
+                    os.remove(csv_path)
+            dataset = ExamDataset.from_snapshot(path, version, self.snapshot_dir)
+            previous = self._dataset.version if self._dataset is not None else None
+            self._dataset = dataset
+            # Recorded only once the file is loaded, so a failed build is
+            # retried on the next check even if the file does not change.
+            self._source_stat = stat
+        logger.info("exam data refreshed: %s -> %s", previous, version)
+        remove_old_versions(version, self.snapshot_dir)
+        return True
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="exam-data-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the current version; the next check retries.
+                logger.exception("exam data refresh failed")
@@ -0,0 +1,210 @@
+import bisect
+import heapq
+import re
+import unicodedata
+
+import numpy as np
+
+SCHOOL = "Iestādes nosaukums"
+ADDRESS = "Iestādes juridiskās adrese"
+YEAR = "Mācību gads"
+LEVEL = "Izglītības līmenis"
+EXAM = "Exam"
+
+POSTAL_CODE = re.compile(r"LV-?\s*\d{4}")
+
+
+def municipality(address):
+    """Municipality of a school address: its last part before the postal code.
+
+    "Skolas iela 1, Kalnciems, Jelgavas nov., LV-3016" -> "Jelgavas nov.",
+    "Iela 3, Rīga" -> "Rīga". Addresses with a single part give "".
+    """
+    if not isinstance(address, str):
+        return ""
+    parts = [part.strip() for part in address.split(",")]
+    parts = [part for part in parts if part and not POSTAL_CODE.fullmatch(part)]
+    return parts[-1] if len(parts) > 1 else ""
+
+
+# =============================================================================
+# School search: diacritic-insensitive word-prefix and trigram index of names
+# =============================================================================
+SEARCH_LIMIT = 20
+
+
+def fold(text):
+    """Lower-case words of text without diacritics: "Rīgas 3. vsk." -> "rigas 3 vsk"."""
+    text = unicodedata.normalize("NFKD", str(text)).casefold()
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SchoolSearch:
+    """Ranked type-ahead search of school names.
+
+    Names are folded once. Every word of a query must occur in a name: at
+    the start of one of its words (a range of the sorted name words), or for
+    words of three or more letters anywhere (through a trigram index).
+    Names starting with the query come first, then those matching more
+    query words at a word start, then shorter names.
+    """
+
+    def __init__(self, schools, municipalities, addresses):
+        self.schools = list(schools)
+        self.municipalities = sorted({name for name in municipalities if name})
+        self._names = [fold(school) for school in self.schools]
+        self._municipality = list(municipalities)
+        self._addresses = [fold(address) if isinstance(address, str) else "" for address in addresses]
+
+        words = sorted({(word, i) for i, name in enumerate(self._names) for word in name.split()})
+        self._words = [word for word, _ in words]
+        self._word_schools = [i for _, i in words]
+
+        self._trigrams = {}
+        for i, name in enumerate(self._names):
+            for gram in _trigrams(name):
+                self._trigrams.setdefault(gram, set()).add(i)
+
+    def _word_starts(self, word):
+        start = bisect.bisect_left(self._words, word)
+        stop = bisect.bisect_left(self._words, word + "\uffff")
+        return set(self._word_schools[start:stop])
+
+    def _containing(self, word):
+        candidates = set.intersection(*(self._trigrams.get(gram, set()) for gram in _trigrams(word)))
+        return {i for i in candidates if word in self._names[i]}
+
+    def search(self, query, municipality="", address="", limit=SEARCH_LIMIT):
+        """Best matching schools for query, at most limit (None: all).
+
+        municipality keeps only its schools, and every word of address must
+        occur in a school's address. An empty query with no filter finds
+        nothing.
+        """
+        words = fold(query).split()
+        address_words = fold(address).split()
+        if not (words or municipality or address_words):
+            return []
+
+        matches = set(range(len(self.schools)))
+        at_word_start = dict.fromkeys(matches, 0)
+        for word in words:
+            starts = self._word_starts(word)
+            for i in starts:
+                at_word_start[i] += 1
+            matches &= (starts | self._containing(word)) if len(word) >= 3 else starts
+        if municipality:
+            matches = {i for i in matches if self._municipality[i] == municipality}
+        for word in address_words:
+            matches = {i for i in matches if word in self._addresses[i]}
+
+        folded = " ".join(words)
+
+        def rank(i):
+            name = self._names[i]
+            return not name.startswith(folded), len(words) - at_word_start[i], len(name), name
+
+        if limit is None:
+            return [self.schools[i] for i in sorted(matches, key=rank)]
+        return [self.schools[i] for i in heapq.nsmallest(limit, matches, key=rank)]
+
+
+# =============================================================================
+# Filter index: school -> year -> level -> exam options and row positions
+# =============================================================================
+class FilterIndex:
+    """Options for the sidebar cascade and the rows behind each selection.
+
+    Built once per dataset version, so filling a dropdown or finding the rows
+    for a selection is a dictionary lookup instead of a boolean mask.
+    """
+
+    def __init__(self, df):
+        self.schools = sorted(df[SCHOOL].dropna().unique())
+
+        # First row of each school (its address does not depend on the class).
+        first = df.groupby(SCHOOL, observed=True, sort=False).indices
+        self._first_row = {school: int(rows[0]) for school, rows in first.items()}
+
+        # Municipality of each school, for comparisons with its neighbours.
+        addresses = df[ADDRESS]
+        self._municipality = {
+            school: municipality(addresses.iloc[row]) for school, row in self._first_row.items()
+        }
+        self._municipality_schools = {}
+        for school, name in self._municipality.items():
+            if name:
+                self._municipality_schools.setdefault(name, []).append(school)
+
+        # Type-ahead search over the names, filterable by municipality/address.
+        self.search = SchoolSearch(
+            self.schools,
+            [self._municipality[school] for school in self.schools],
+            [addresses.iloc[self._first_row[school]] for school in self.schools],
+        )
+
+        self._years = {}
+        for school, year in df.groupby([SCHOOL, YEAR], observed=True).size().index:
+            self._years.setdefault(school, []).append(year)
+
+        self._level_rows = {
+            key: int(count)
+            for key, count in df.groupby([SCHOOL, YEAR, LEVEL], observed=True).size().items()
+        }
+
+        # Row positions of every selection, stored back to back in one array
+        # (row_order) with a (start, stop) slice per selection.
+        groups = df.groupby([SCHOOL, YEAR, LEVEL, EXAM], observed=True).indices
+        self._rows = {}
+        start = 0
+        for key, rows in groups.items():
+            self._rows[key] = (start, start + len(rows))
+            start += len(rows)
+        self.row_order = np.concatenate(list(groups.values())) if groups else np.empty(0, dtype=np.intp)
+
+        self._exams = {}
+        self._exam_schools = {}
+        for school, year, level, exam in self._rows:
+            self._exams.setdefault((school, year, level), []).append(exam)
+            self._exam_schools.setdefault((year, level, exam), []).append(school)
+
+        for years in self._years.values():
+            years.sort()
+        for exams in self._exams.values():
+            exams.sort()
+        for schools in (*self._exam_schools.values(), *self._municipality_schools.values()):
+            schools.sort()
+
+    def first_row(self, school):
+        return self._first_row[school]
+
+    def years(self, school):
+        return self._years.get(school, [])
+
+    def level_rows(self, school, year, level):
+        """Number of rows the school has at this education level in year."""
+        return self._level_rows.get((school, year, level), 0)
+
+    def exams(self, school, year, level):
+        return self._exams.get((school, year, level), [])
+
+    def exam_schools(self, year, level, exam):
+        """Schools with results for this exam, year and education level."""
+        return self._exam_schools.get((year, level, exam), [])
+
+    def municipality(self, school):
+        return self._municipality.get(school, "")
+
+    def municipality_schools(self, school):
+        """All schools in the same municipality as school (itself included)."""
+        return self._municipality_schools.get(self.municipality(school), [])
+
+    def rows(self, school, year, level, exam):
+        """Row positions (for df.iloc / .take) of one full selection."""
+        start, stop = self._rows.get((school, year, level, exam), (0, 0))
+        return self.row_order[start:stop]
@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import html
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter
+
+import altair as alt
+
+import exam_charts
+import exam_data
+import exam_dataset
+
+# =============================================================================
+# Batch export of per-school exam reports
+# =============================================================================
+# One static HTML report per school with the dashboard's histogram, national
+# rank, summary statistics and trend for every exam of a year, optionally
+# with the charts as PNG/SVG files (needs vl-convert-python). Example:
+#   python export_reports.py --output reports --year 2023 --format html png
+# The dataset and its aggregates are built once and shared with the worker
+# processes. manifest.json in the output directory records each school's data
+# hash, and schools whose hash is unchanged are skipped (unless --force).
+
+REPORT_FORMAT = 2  # bump when the report layout changes; re-renders every school
+MANIFEST = "manifest.json"
+FORMATS = ["html", "png", "svg"]
+
+# Set in the parent before the pool forks (shared copy-on-write), or loaded
+# from the snapshot by _init_worker where processes are spawned.
+_data = None
+
+
+def _init_worker(source, snapshot_dir):
+    global _data
+    if _data is None:
+        _data = exam_dataset.ExamDataset.load(source, snapshot_dir)
+
+
+def slugify(name):
+    """File name for a school: ASCII letters and digits joined by dashes."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return re.sub(r"[^A-Za-z0-9]+", "-", ascii_name).strip("-").lower() or "skola"
+
+
+def report_slugs(schools):
+    """File name of every school's report, unique among schools.
+
+    Schools whose names slugify alike ("Rīgas 1. skola", "Rigas 1 skola")
+    get a short hash of the name appended instead of sharing one file.
+    """
+    slugs = {school: slugify(school) for school in schools}
+    counts = Counter(slugs.values())
+    for school, slug in slugs.items():
+        if counts[slug] > 1:
+            slugs[school] = f"{slug}-{hashlib.sha256(school.encode('utf-8')).hexdigest()[:8]}"
+    return slugs
+
+
+def report_sections(data, school, year):
+    """Every (level, exam) of the school in year, with the data it shows."""
+    sections = []
+    for level in exam_data.GRADE_BANDS:
+        for exam in data.filters.exams(school, year, level):
+            school_counts = data.histograms.school(year, exam, school, level)
+            if school_counts.sum() == 0:
+                continue
+            sections.append({
+                "level": level,
+                "exam": exam,
+                "school_counts": school_counts.tolist(),
+                "country_counts": data.histograms.country(year, exam).tolist(),
+                "rank": data.rankings.school(year, exam, school, level),
+                "summary": exam_charts.summary_frame(data.distributions, year, exam, school, level)
+                                      .round(2).to_dict("index"),
+                "trend": [data.trends.school(school, level, exam).round(2).reset_index().to_numpy().tolist(),
+                          data.trends.country(level, exam).round(2).reset_index().to_numpy().tolist()],
+            })
+    return sections
+
+
+def data_hash(sections, formats):
+    payload = json.dumps([REPORT_FORMAT, sorted(formats), sections], sort_keys=True, default=float)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _embed(div_id, chart):
+    return (f'<div id="{div_id}"></div>\n'
+            f'<script>vegaEmbed("#{div_id}", {chart.to_json(indent=None)}, {{"actions": false}});</script>')
+
+
+def render_html(data, school, year, sections):
+    title = html.escape(school)
+    parts = [
+        "<!DOCTYPE html>",
+        '<html lang="lv"><head><meta charset="utf-8">',
+        f"<title>{title} - eksāmenu rezultāti {year}</title>",
+        f'<script src="https://cdn.jsdelivr.net/npm/vega@{alt.VEGA_VERSION}"></script>',
+        f'<script src="https://cdn.jsdelivr.net/npm/vega-lite@{alt.VEGALITE_VERSION}"></script>',
+        f'<script src="https://cdn.jsdelivr.net/npm/vega-embed@{alt.VEGAEMBED_VERSION}"></script>',
+        "</head><body>",
+        f"<h1>{title}</h1>",
+        f"<p><b>Adrese:</b> {html.escape(str(data.address(school)))}<br>",
+        f"<b>Mācību gads:</b> {year}</p>",
+    ]
+    for i, section in enumerate(sections):
+        level, exam = section["level"], section["exam"]
+        parts.append(f"<h2>{html.escape(exam)} ({html.escape(level)})</h2>")
+        parts.append(f"<p><b>Kopējais eksāmena kārtotāju skaits:</b> {sum(section['school_counts'])}</p>")
+        rank = section["rank"]
+        if rank is not None:
+            parts.append(f"<p><b>Vieta valstī:</b> {int(rank['rank'])}. no {int(rank['schools'])} "
+                         f"(procentile {rank['percentile']:.0f})</p>")
+        summary = exam_charts.summary_frame(data.distributions, year, exam, school, level)
+        parts.append(summary.to_html(float_format="{:.1f}".format))
+        parts.append(_embed(f"histogram-{i}",
+                            exam_charts.build_histogram_chart(data.histograms, year, exam, school, level)))
+        parts.append(_embed(f"trend-{i}", exam_charts.build_trend_chart(data.trends, exam, school, level)))
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def save_images(data, school, year, sections, directory, formats):
+    os.makedirs(directory, exist_ok=True)
+    for i, section in enumerate(sections):
+        level, exam = section["level"], section["exam"]
+        charts = {
+            "histogram": exam_charts.build_histogram_chart(data.histograms, year, exam, school, level),
+            "trend": exam_charts.build_trend_chart(data.trends, exam, school, level),
+        }
+        for name, chart in charts.items():
+            for fmt in formats:
+                chart.save(os.path.join(directory, f"{i:02d}-{slugify(exam)}-{slugify(level)}-{name}.{fmt}"))
+
+
+def export_school(task):
+    """Render one school's report unless its data hash is unchanged.
+
+    Returns (school, hash, status) with status "written", "skipped" or
+    "no data".
+    """
+    school, slug, year, output, formats, previous, force = task
+    if year is None:
+        years = _data.filters.years(school)
+        year = years[-1] if years else None
+    sections = report_sections(_data, school, year) if year is not None else []
+    if not sections:
+        return school, None, "no data"
+
+    digest = data_hash(sections, formats)
+    html_path = os.path.join(output, f"{slug}.html")
+    written = os.path.exists(html_path) if "html" in formats else os.path.isdir(os.path.join(output, slug))
+    if not force and digest == previous and written:
+        return school, digest, "skipped"
+
+    if "html" in formats:
+        tmp_path = html_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            fh.write(render_html(_data, school, year, sections))
+        os.replace(tmp_path, html_path)
+    images = [fmt for fmt in formats if fmt != "html"]
+    if images:
+        save_images(_data, school, year, sections, os.path.join(output, slug), images)
+    return school, digest, "written"
+
+
+def _read_manifest(output):
+    try:
+        with open(os.path.join(output, MANIFEST), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_reports(output, source=exam_data.SOURCE, snapshot_dir=exam_data.SNAPSHOT_DIR, year=None,
+                   schools=None, formats=("html",), workers=None, force=False):
+    """Export reports for schools (default: all) and return status counts."""
+    global _data
+    _data = exam_dataset.ExamDataset.load(source, snapshot_dir)
+    os.makedirs(output, exist_ok=True)
+    manifest = _read_manifest(output)
+    # An html-only manifest entry must not count for a png/svg run, and so on.
+    hashes = manifest.get("schools", {}) if manifest.get("formats") == sorted(formats) else {}
+
+    schools = schools or _data.filters.schools
+    # Slugs come from every school, so a --schools run writes the same files.
+    slugs = report_slugs(dict.fromkeys(list(_data.filters.schools) + list(schools)))
+    tasks = [(school, slugs[school], year, output, list(formats), hashes.get(school), force) for school in schools]
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context("spawn")
+    counts = {"written": 0, "skipped": 0, "no data": 0}
+    with context.Pool(workers, initializer=_init_worker, initargs=(source, snapshot_dir)) as pool:
+        for school, digest, status in pool.imap_unordered(export_school, tasks, chunksize=4):
+            counts[status] += 1
+            if digest is not None:
+                hashes[school] = digest
+            print(f"{status:<8} {school}", file=sys.stderr)
+
+    exam_data._write_json(os.path.join(output, MANIFEST), {
+        "version": _data.version, "formats": sorted(formats), "schools": hashes,
+    })
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a static exam report for every school.")
+    parser.add_argument("--output", default="reports", help="directory for the reports")
+    parser.add_argument("--source", default=exam_data.SOURCE, help="exam CSV path or URL")
+    parser.add_argument("--snapshot-dir", default=exam_data.SNAPSHOT_DIR)
+    parser.add_argument("--year", type=int, help="school year (default: each school's latest)")
+    parser.add_argument("--schools", nargs="+", help="only these schools")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=["html"], dest="formats")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-render schools whose data is unchanged")
+    args = parser.parse_args()
+
+    if set(args.formats) - {"html"} and importlib.util.find_spec("vl_convert") is None:
+        parser.error("PNG/SVG export needs vl-convert-python (pip install vl-convert-python)")
+
+    start = time.perf_counter()
+    counts = export_reports(args.output, args.source, args.snapshot_dir, args.year, args.schools,
+                            args.formats, args.workers, args.force)
+    print(", ".join(f"{status}: {n}" for status, n in counts.items())
+          + f" ({time.perf_counter() - start:.1f} s)")
@@ -0,0 +1,196 @@
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+
+import exam_data
+
+# =============================================================================
+# Settings
+# =============================================================================
+# EXAM_GEOCODER selects the backend: "nominatim" (default), "none", or the path
+# of a gazetteer CSV with address,lat,lon columns for offline use and tests.
+GEOCODER = os.environ.get("EXAM_GEOCODER", "nominatim")
+GEOCODE_DB = os.environ.get("EXAM_GEOCODE_DB", os.path.join(exam_data.SNAPSHOT_DIR, "geocode.sqlite"))
+USER_AGENT = "exam_dashboard"
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_address(address):
+    """Cache key for an address: NFC, case-folded, single-spaced."""
+    text = unicodedata.normalize("NFC", str(address))
+    return " ".join(text.casefold().replace(",", ", ").split())
+
+
+# =============================================================================
+# Geocoders: anything with geocode(address) -> (lat, lon) or (None, None).
+# GeocoderError means "try again later"; a (None, None) result is final.
+# =============================================================================
+class GeocoderError(Exception):
+    pass
+
+
+class NominatimGeocoder:
+    """OpenStreetMap Nominatim, limited to one request per second."""
+
+    def __init__(self, user_agent=USER_AGENT, min_delay_seconds=1):
+        from geopy.extra.rate_limiter import RateLimiter
+        from geopy.geocoders import Nominatim
+
+        geolocator = Nominatim(user_agent=user_agent)
+        self._geocode = RateLimiter(geolocator.geocode, min_delay_seconds=min_delay_seconds,
+                                    swallow_exceptions=False)
+
+    def geocode(self, address):
+        from geopy.exc import GeopyError
+
+        try:
+            location = self._geocode(address)
+        except GeopyError as e:
+            raise GeocoderError(str(e)) from e
+        if location:
+            return location.latitude, location.longitude
+        return None, None
+
+
+class GazetteerGeocoder:
+    """Offline lookup in a CSV file with address, lat and lon columns."""
+
+    def __init__(self, path):
+        self._places = {}
+        with open(path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                self._places[normalize_address(row["address"])] = (float(row["lat"]), float(row["lon"]))
+
+    def geocode(self, address):
+        return self._places.get(normalize_address(address), (None, None))
+
+
+class NullGeocoder:
+    """Never finds anything; used when geocoding is switched off."""
+
+    def geocode(self, address):
+        return None, None
+
+
+def make_geocoder(name=GEOCODER):
+    if name == "nominatim":
+        return NominatimGeocoder()
+    if name == "none":
+        return NullGeocoder()
+    return GazetteerGeocoder(name)
+
+
+# =============================================================================
+# Persistent store: SQLite table keyed by normalized address
+# =============================================================================
+class GeocodeStore:
+    """Geocoding results on disk, shared by restarts and replicas.
+
+    Addresses the geocoder could not find are stored with NULL coordinates so
+    they are not looked up again.
+    """
+
+    def __init__(self, path=GEOCODE_DB):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                " address TEXT PRIMARY KEY, lat REAL, lon REAL, updated REAL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, address):
+        """Return (lat, lon) if address is stored (possibly (None, None)), else None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT lat, lon FROM geocodes WHERE address = ?", (normalize_address(address),)
+            ).fetchone()
+        return row
+
+    def put(self, address, lat, lon):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO geocodes (address, lat, lon, updated) VALUES (?, ?, ?, ?)",
+                (normalize_address(address), lat, lon, time.time()),
+            )
+
+    def known(self):
+        with self._connect() as conn:
+            return {address for (address,) in conn.execute("SELECT address FROM geocodes")}
+
+
+class CachedGeocoder:
+    """Looks addresses up in memory, then on disk, then with the geocoder."""
+
+    def __init__(self, store, geocoder):
+        self.store = store
+        self.geocoder = geocoder
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(GeocodeStore(GEOCODE_DB), make_geocoder(GEOCODER))
+
+    def locate(self, address):
+        key = normalize_address(address)
+        if key in self._memory:
+            return self._memory[key]
+
+        result = self.store.get(address)
+        if result is None:
+            # One live lookup at a time keeps us within the rate limit.
+            with self._lock:
+                result = self.store.get(address)
+                if result is None:
+                    try:
+                        result = self.geocoder.geocode(address)
+                    except GeocoderError as e:
+                        logger.warning("geocoding %r failed: %s", address, e)
+                        return None, None
+                    self.store.put(address, *result)
+        self._memory[key] = tuple(result)
+        return self._memory[key]
+
+
+# =============================================================================
+# Batch pre-warm: geocode every school address ahead of time
+# =============================================================================
+def prewarm(addresses, store, geocoder):
+    """Geocode the addresses missing from store; returns (done, found, failed)."""
+    known = store.known()
+    pending = sorted({a for a in addresses if isinstance(a, str) and normalize_address(a) not in known})
+    found = failed = 0
+    for i, address in enumerate(pending, 1):
+        try:
+            lat, lon = geocoder.geocode(address)
+        except GeocoderError as e:
+            logger.warning("geocoding %r failed: %s", address, e)
+            failed += 1
+            continue
+        store.put(address, lat, lon)
+        found += lat is not None
+        logger.info("[%d/%d] %s -> %s, %s", i, len(pending), address, lat, lon)
+    return len(pending) - failed, found, failed
+
+
+if __name__ == "__main__":
+    # Fill the geocode store for every address in the exam data:
+    #   python geocoding.py [csv path or URL]
+    logging.basicConfig(level=logging.INFO)
+    source = sys.argv[1] if len(sys.argv) > 1 else exam_data.SOURCE
+    df, _ = exam_data.load_exams(source)
+    done, found, failed = prewarm(
+        df["Iestādes juridiskās adrese"].dropna().unique(), GeocodeStore(GEOCODE_DB), make_geocoder(GEOCODER)
+    )
+    print(f"geocoded {done} new addresses ({found} found, {failed} failed) into {GEOCODE_DB}")
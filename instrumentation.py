@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import sys
+import time
+
+import streamlit as st
+
+# =============================================================================
+# Per-rerun stage timing
+# =============================================================================
+# Every stage of a rerun is logged as one JSON line on the "dashboard.timing"
+# logger (app, session, rerun, stage, ms, rows). EXAM_TIMING_LOG=off silences
+# it. The sidebar debug panel is shown with EXAM_DEBUG_PANEL=1 or ?debug=1.
+
+TIMING_LOG = os.environ.get("EXAM_TIMING_LOG", "on").lower() not in ("0", "off", "false")
+DEBUG_PANEL = os.environ.get("EXAM_DEBUG_PANEL", "0").lower() in ("1", "on", "true")
+
+logger = logging.getLogger("dashboard.timing")
+if TIMING_LOG and not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+elif not TIMING_LOG:
+    logger.setLevel(logging.WARNING)
+
+
+def _script_run_ctx():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx()
+    except ImportError:
+        return None
+
+
+def _session_id():
+    ctx = _script_run_ctx()
+    return ctx.session_id if ctx is not None else "-"
+
+
+def _fragment_rerun():
+    ctx = _script_run_ctx()
+    return bool(ctx is not None and getattr(ctx, "fragment_ids_this_run", None))
+
+
+def debug_panel_enabled():
+    return DEBUG_PANEL or st.query_params.get("debug") == "1"
+
+
+class RerunTimer:
+    """Laps through the stages of one script run.
+
+    Call lap(stage) right after each stage; its duration is the time since
+    the previous lap (or since the timer was created).
+    """
+
+    def __init__(self, app, panel=True):
+        self.app = app
+        self.session = _session_id()
+        counter_key = f"_rerun_count_{app}"
+        st.session_state[counter_key] = st.session_state.get(counter_key, 0) + 1
+        self.rerun = st.session_state[counter_key]
+        self.stages = []
+        self._panel = None
+        if panel and debug_panel_enabled():
+            self._panel = st.sidebar.expander("Ātrdarbība (debug)").empty()
+        st.session_state[f"_rerun_timer_{app}"] = self
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage, rows=None):
+        now = time.perf_counter()
+        record = {"stage": stage, "ms": round((now - self._last) * 1000, 2)}
+        if rows is not None:
+            record["rows"] = int(rows)
+        self.stages.append(record)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"app": self.app, "session": self.session, "rerun": self.rerun, **record},
+                                   ensure_ascii=False))
+        if self._panel is not None:
+            self._show()
+        # Time spent logging and drawing the panel is not charged to a stage.
+        self._last = time.perf_counter()
+
+    def _show(self):
+        lines = [f"rerun {self.rerun}, session {self.session[:8]}", ""]
+        lines += [
+            f"- **{r['stage']}**: {r['ms']:.1f} ms" + (f" ({r['rows']} rindas)" if "rows" in r else "")
+            for r in self.stages
+        ]
+        total = sum(r["ms"] for r in self.stages)
+        lines.append(f"- **kopā**: {total:.1f} ms")
+        self._panel.markdown("\n".join(lines))
+
+
+def section_timer(app):
+    """Timer for a section that may rerun on its own as a fragment.
+
+    During a full rerun this is the script's RerunTimer; a fragment-only
+    rerun gets a fresh one (its own rerun number, no debug panel, since a
+    fragment cannot write to the sidebar).
+    """
+    timer = st.session_state.get(f"_rerun_timer_{app}")
+    if timer is None or _fragment_rerun():
+        timer = RerunTimer(app, panel=False)
+    return timer
@@ -0,0 +1,409 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+import benchmark
+import synthetic_data
+
+# =============================================================================
+# Concurrent-session load test for both dashboards
+# =============================================================================
+# Starts the app with `streamlit run` and connects many simulated users to it
+# over the same websocket protocol the browser speaks. Each session makes
+# random filter changes (fragment reruns included, as in the browser) for a
+# number of rounds. The report gives rerun throughput, p50/p95/p99 rerun
+# latency (overall and per kind of interaction) and the server memory per
+# session. Example:
+#   python load_test.py --app scratch_20.py --size 1M --sessions 50 --output load.json
+#
+# Memory is the server's RSS after each round minus its RSS once one warm-up
+# session has loaded the shared data, divided by the number of sessions. RSS
+# that keeps growing from round to round with the same sessions points to a
+# per-session leak. A rerun's latency runs from sending the widget change to
+# the server's "script finished" message.
+#
+# AppTest cannot stand in for the server here: its runs swap a process-wide
+# Runtime in and out, so two sessions cannot run at the same time. An already
+# running server can be targeted with --url (started with
+# --server.enableXsrfProtection=false); pass its --pid to get memory figures.
+
+APPS = benchmark.APPS
+PORT = 8599
+
+# Search words for scratch_20.py: town prefixes as analysts would type them.
+QUERIES = [town[:length] for town in synthetic_data.MUNICIPALITIES for length in (3, 5)]
+PLACEHOLDERS = {"Izvēlies skolu"}
+
+# Interactions per app as (name, widget kind, label prefix). An interaction
+# whose widget is not on the page is skipped and another one is drawn.
+ACTIONS = {
+    "scratch_20.py": [
+        ("search", "text_input", "Meklēt skolu:"),
+        ("school", "selectbox", "Izvēlies skolu:"),
+        ("year", "selectbox", "Izvēlies gadu:"),
+        ("level", "selectbox", "Izvēlies izglītības līmeni:"),
+        ("exam", "selectbox", "Izvēlies eksāmenu:"),
+        ("bins", "selectbox", "Intervāla platums:"),
+        ("compare", "multiselect", "Salīdzināt ar skolām:"),
+        ("municipality", "checkbox", "Salīdzināt ar visām skolām:"),
+    ],
+    "scratch_19.py": [
+        ("school", "selectbox", "Izvēlies skolu:"),
+        ("tab", "tabs", ""),
+        ("exam_type", "radio", "Izvēlies eksāmenu tipu:"),
+        ("class", "selectbox", "Izvēlies klasi:"),
+        ("subject", "selectbox", "Izvēlies priekšmetu:"),
+    ],
+}
+
+VALUE_FIELDS = {
+    "selectbox": "string_value",
+    "radio": "string_value",
+    "text_input": "string_value",
+    "tabs": "string_value",
+    "checkbox": "bool_value",
+    "multiselect": "string_array_value",
+}
+
+
+class Widget:
+    """A widget on a session's page, as the browser would know it."""
+
+    def __init__(self, kind, widget_id, label, options, value, fragment_id, disabled=False):
+        self.kind = kind
+        self.id = widget_id
+        self.label = label
+        self.options = options
+        self.value = value
+        self.fragment_id = fragment_id
+        self.disabled = disabled
+
+
+def _element_widget(element, fragment_id):
+    kind = element.WhichOneof("type")
+    if kind not in VALUE_FIELDS:
+        return None
+    proto = getattr(element, kind)
+    options = list(getattr(proto, "options", []))
+    if kind in ("selectbox", "radio"):
+        if proto.set_value:
+            value = proto.raw_value
+        else:
+            value = options[proto.default] if proto.HasField("default") and options else None
+    elif kind == "multiselect":
+        value = list(proto.raw_values) if proto.set_value else [options[i] for i in proto.default]
+    else:
+        value = proto.value if proto.set_value else proto.default
+    return Widget(kind, proto.id, proto.label, options, value, fragment_id, proto.disabled)
+
+
+def _widget_state(widget, value):
+    state = WidgetState(id=widget.id)
+    if widget.kind == "multiselect":
+        state.string_array_value.data.extend(value)
+    else:
+        setattr(state, VALUE_FIELDS[widget.kind], value)
+    return state
+
+
+def rss_mb(pid):
+    """Resident memory of process pid in MB, or None where it cannot be read."""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Session:
+    """One simulated user: a websocket session, its page and its timings."""
+
+    def __init__(self, url, app, seed):
+        self.url = url
+        self.app = app
+        self.rng = random.Random(seed)
+        self.page = {}  # delta path -> Widget
+        self.states = {}  # widget id -> WidgetState of every value set so far
+        self.reruns = []
+        self.errors = []
+        self._ws = None
+
+    async def connect(self):
+        self._ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def rerun(self, name, fragment_id=""):
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        if fragment_id:
+            message.rerun_script.fragment_id = fragment_id
+
+        start = time.perf_counter()
+        await self._ws.send(message.SerializeToString())
+        widgets, tabs, fragments = {}, {}, {fragment_id}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self._ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "script_finished":
+                break
+            if kind == "delta":
+                self._read_delta(name, forward, widgets, tabs)
+                fragments.add(forward.delta.fragment_id)
+        self.reruns.append((name, time.perf_counter() - start))
+
+        for path, labels in tabs.items():
+            if path in widgets:
+                widgets[path].options = labels
+                widgets[path].value = widgets[path].value or labels[0]
+        if fragment_id:
+            # Only the fragment (and those nested in it) was sent again.
+            self.page = {path: widget for path, widget in self.page.items() if widget.fragment_id not in fragments}
+            self.page.update(widgets)
+        else:
+            self.page = widgets
+        ids = {widget.id for widget in self.page.values()}
+        self.states = {widget_id: state for widget_id, state in self.states.items() if widget_id in ids}
+
+    def _read_delta(self, name, forward, widgets, tabs):
+        delta = forward.delta
+        path = tuple(forward.metadata.delta_path)
+        if delta.HasField("new_element"):
+            element = delta.new_element
+            if element.WhichOneof("type") == "exception":
+                self.errors.append(f"{name}: {element.exception.type}: {element.exception.message}")
+            widget = _element_widget(element, delta.fragment_id)
+            if widget is not None:
+                widgets[path] = widget
+        elif delta.HasField("add_block"):
+            block = delta.add_block
+            if block.HasField("tab_container") and block.tab_container.id:
+                container = block.tab_container
+                widgets[path] = Widget("tabs", container.id, "", [], container.default_tab_label or None,
+                                       delta.fragment_id)
+            elif block.HasField("tab"):
+                tabs.setdefault(path[:-1], []).append(block.tab.label)
+
+    def _random_value(self, widget):
+        if widget.kind == "checkbox":
+            return not widget.value
+        if widget.kind == "multiselect":
+            return self.rng.sample(widget.options, min(len(widget.options), self.rng.randint(0, 5)))
+        if widget.kind == "text_input":
+            query = self.rng.choice(QUERIES)
+            return query + f" {self.rng.randint(1, 40)}" if self.rng.random() < 0.5 else query
+        options = [option for option in widget.options if option != widget.value and option not in PLACEHOLDERS]
+        return self.rng.choice(options) if options else None
+
+    async def interact(self):
+        """Apply one random interaction that is possible on the page, then rerun."""
+        actions = ACTIONS[self.app][:]
+        self.rng.shuffle(actions)
+        for name, kind, label in actions:
+            for widget in self.page.values():
+                if widget.kind == kind and widget.label.startswith(label) and not widget.disabled:
+                    break
+            else:
+                continue
+            value = self._random_value(widget)
+            if value is None:
+                continue
+            widget.value = value
+            self.states[widget.id] = _widget_state(widget, value)
+            await self.rerun(name, widget.fragment_id)
+            return
+        await self.rerun("rerun")
+
+
+def _percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    if len(ms) == 0:
+        return {}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"count": len(ms), "p50": round(p50, 1), "p95": round(p95, 1), "p99": round(p99, 1),
+            "max": round(float(ms.max()), 1)}
+
+
+async def load_test(url, app, sessions, rounds, interactions, think=0.0, seed=0, pid=None):
+    """Run sessions concurrent users against the server at url; return the report."""
+    # The first session pays for loading the data into the shared caches,
+    # as the first visitor of a server would. It stays connected, idle.
+    start = time.perf_counter()
+    warmup = Session(url, app, seed - 1)
+    await warmup.connect()
+    await warmup.rerun("start")
+    await warmup.interact()
+    warmup_seconds = time.perf_counter() - start
+    baseline = rss_mb(pid)
+
+    users = [Session(url, app, seed + i) for i in range(sessions)]
+    memory = []
+    barrier = asyncio.Barrier(sessions)
+
+    async def user(session):
+        try:
+            await session.connect()
+            await session.rerun("start")
+            for _ in range(rounds):
+                for _ in range(interactions):
+                    if think:
+                        await asyncio.sleep(session.rng.expovariate(1 / think))
+                    await session.interact()
+                # Sample memory while every session is idle.
+                if await barrier.wait() == 0:
+                    memory.append(rss_mb(pid))
+                await barrier.wait()
+        except Exception as e:
+            # Release the other sessions instead of leaving them at the barrier.
+            session.errors.append(f"session stopped: {e!r}")
+            await barrier.abort()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(session) for session in users))
+    seconds = time.perf_counter() - start
+    for session in [warmup] + users:
+        await session.close()
+
+    reruns = [rerun for session in users for rerun in session.reruns]
+    errors = [error for session in users for error in session.errors]
+    by_action = {}
+    for name, elapsed in reruns:
+        by_action.setdefault(name, []).append(elapsed)
+    per_session = [(mb - baseline) / sessions for mb in memory if mb is not None and baseline is not None]
+    return {
+        "app": app,
+        "sessions": sessions,
+        "rounds": rounds,
+        "interactions": interactions,
+        "think_s": think,
+        "warmup_s": round(warmup_seconds, 2),
+        "seconds": round(seconds, 2),
+        "reruns": len(reruns),
+        "throughput": round(len(reruns) / seconds, 1) if seconds else 0.0,
+        "latency_ms": _percentiles([elapsed for _, elapsed in reruns]),
+        "actions": {name: _percentiles(times) for name, times in sorted(by_action.items())},
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "baseline_mb": round(baseline, 1) if baseline is not None else None,
+        "rss_mb": [round(mb, 1) for mb in memory if mb is not None],
+        "per_session_mb": [round(mb, 2) for mb in per_session],
+        # Steady-state growth: from the end of the first round to the last.
+        "growth_per_session_round_mb": (round((per_session[-1] - per_session[0]) / (len(per_session) - 1), 3)
+                                        if len(per_session) > 1 else None),
+    }
+
+
+def start_server(app, port, csv_path, snapshot_dir, log_path):
+    """Start `streamlit run app` on port and wait until it answers."""
+    env = dict(os.environ,
+               EXAM_CSV_SOURCE=csv_path,
+               EXAM_SNAPSHOT_DIR=snapshot_dir,
+               EXAM_GEOCODER="none",
+               EXAM_GEOCODE_DB=os.path.join(snapshot_dir, "geocode.sqlite"),
+               EXAM_TIMING_LOG="off")
+    with open(log_path, "w", encoding="utf-8") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(benchmark.HERE, app),
+             "--server.headless", "true", "--server.port", str(port),
+             "--server.enableXsrfProtection", "false", "--browser.gatherUsageStats", "false"],
+            env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"{app} server exited, see {log_path}")
+        try:
+            urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"{app} server did not start, see {log_path}")
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print(f"{report['app']:<14} {report['sessions']} sessions, {report['reruns']} reruns in {report['seconds']:.1f} s "
+          f"({report['throughput']:.1f}/s), {report['errors']} errors")
+    if latency:
+        print(f"  rerun latency: p50={latency['p50']:.0f}ms p95={latency['p95']:.0f}ms "
+              f"p99={latency['p99']:.0f}ms max={latency['max']:.0f}ms")
+    for name, stats in report["actions"].items():
+        print(f"    {name:<13} n={stats['count']:<5} p50={stats['p50']:.0f}ms p95={stats['p95']:.0f}ms")
+    if report["per_session_mb"]:
+        growth = report["growth_per_session_round_mb"]
+        print(f"  memory: baseline {report['baseline_mb']:.0f}MB, per session after each round "
+              + " ".join(f"{mb:.2f}" for mb in report["per_session_mb"]) + " MB"
+              + (f", growth {growth:+.3f} MB/session/round" if growth is not None else ""))
+    for error in report["first_errors"]:
+        print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a dashboard server with many concurrent sessions.")
+    parser.add_argument("--app", nargs="+", choices=APPS, default=APPS, dest="apps")
+    parser.add_argument("--size", choices=list(benchmark.SIZES), default="10k", help="synthetic data size")
+    parser.add_argument("--csv", help="exam CSV to use instead of synthetic data (scratch_20.py)")
+    parser.add_argument("--data-dir", default=os.path.join(benchmark.HERE, ".bench_data"))
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--rounds", type=int, default=5, help="memory is sampled after every round")
+    parser.add_argument("--interactions", type=int, default=10, help="interactions per session per round")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between interactions (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=PORT, help="port for the started server")
+    parser.add_argument("--url", help="websocket URL of a running server, e.g. ws://localhost:8501/_stcore/stream")
+    parser.add_argument("--pid", type=int, help="process id of the --url server, for memory figures")
+    parser.add_argument("--output", help="write all reports to this JSON file")
+    args = parser.parse_args()
+    if args.url and len(args.apps) != 1:
+        parser.error("--url needs exactly one --app (the one the server runs)")
+
+    reports = []
+    if args.url:
+        reports.append(asyncio.run(load_test(args.url, args.apps[0], args.sessions, args.rounds,
+                                             args.interactions, args.think, args.seed, args.pid)))
+        print_report(reports[-1])
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        csv_path = args.csv or os.path.join(args.data_dir, f"viis-{args.size}.csv")
+        if not os.path.exists(csv_path):
+            print(f"generating {args.size} rows -> {csv_path}", file=sys.stderr)
+            synthetic_data.write_csv(csv_path, benchmark.SIZES[args.size])
+        snapshot_dir = os.path.join(args.data_dir, f"snapshots-{args.size if args.csv is None else 'csv'}")
+
+        for app in args.apps:
+            log_path = os.path.join(args.data_dir, f"load-{os.path.splitext(app)[0]}.log")
+            server = start_server(app, args.port, csv_path, snapshot_dir, log_path)
+            try:
+                report = asyncio.run(load_test(f"ws://localhost:{args.port}/_stcore/stream", app, args.sessions,
+                                               args.rounds, args.interactions, args.think, args.seed, server.pid))
+            finally:
+                server.terminate()
+                server.wait()
+            reports.append(report)
+            print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(reports, fh, indent=2, ensure_ascii=False)
@@ -0,0 +1,76 @@
+import os
+
+import pandas as pd
+
+# =============================================================================
+# School information panel data store
+# =============================================================================
+# Two files in PANEL_DIR:
+# - skolu_fakti.csv: one row of facts per school (sector, address, staff, ...)
+# - skolu_dati.csv: every number the panel charts, in long format with one
+#   value per (skola, metrika, klase, prieksmets, gads, grupa, kategorija).
+#   grupa is "Skola"/"Valsts vidējais", kategorija a gender or quartile.
+#   Columns that do not apply to a metric are left empty.
+
+PANEL_DIR = os.environ.get("SCHOOL_PANEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+# Run only the open tab of the panel (set SCHOOL_PANEL_LAZY_TABS=0 to render all).
+LAZY_TABS = os.environ.get("SCHOOL_PANEL_LAZY_TABS", "1").lower() not in ("0", "off", "false")
+INDEX = ["skola", "metrika", "klase", "prieksmets", "gads"]
+TEXT_COLUMNS = ["skola", "metrika", "klase", "prieksmets", "grupa", "kategorija"]
+
+
+class SchoolPanelStore:
+    """Long-format panel values indexed by (school, metric, class, subject, year).
+
+    Each chart reads one slice of the sorted index, so the cost of a click
+    does not grow with the number of schools.
+    """
+
+    def __init__(self, facts, values):
+        self.facts = facts.set_index("skola")
+        self.schools = list(self.facts.index)
+
+        values = values.copy()
+        for column in TEXT_COLUMNS:
+            values[column] = values[column].fillna("").astype(str)
+        values["gads"] = values["gads"].astype("Int16")
+
+        # Class and subject choices in the order they appear in the file.
+        options = values[["skola", "metrika", "klase", "prieksmets"]].drop_duplicates()
+        self._options = {}
+        for school, metric, klase, subject in options.itertuples(index=False):
+            classes = self._options.setdefault((school, metric), {})
+            classes.setdefault(klase, []).append(subject)
+
+        self.values = values.set_index(INDEX).sort_index()
+
+    @classmethod
+    def load(cls, directory=PANEL_DIR):
+        facts = pd.read_csv(os.path.join(directory, "skolu_fakti.csv"))
+        values = pd.read_csv(os.path.join(directory, "skolu_dati.csv"))
+        return cls(facts, values)
+
+    def school_facts(self, school):
+        facts = self.facts.loc[school].to_dict()
+        facts["nosaukums"] = school
+        return facts
+
+    def classes(self, school, metric):
+        return list(self._options.get((school, metric), {}))
+
+    def subjects(self, school, metric, klase):
+        return self._options.get((school, metric), {}).get(klase, [])
+
+    def series(self, school, metric, klase="", subject="", columns=None):
+        """Rows of one metric: gads, grupa, kategorija and vertiba columns.
+
+        columns, a {column: new name} mapping, selects and renames columns.
+        """
+        try:
+            frame = self.values.loc[(school, metric, klase, subject)]
+        except KeyError:
+            frame = self.values.iloc[:0].droplevel(INDEX[:-1])
+        frame = frame.reset_index()
+        if columns is not None:
+            frame = frame[list(columns)].rename(columns=columns)
+        return frame
@@ -1,228 +1,275 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+
+import chart_cache
+import exam_aggregates
+import exam_charts
+import exam_data
+import exam_dataset
+import exam_index
+import geocoding
+import instrumentation
+
+# Per-stage timings of this rerun (structured log + optional debug panel).
+timer = instrumentation.RerunTimer("scratch_20")
 
 st.title("Eksāmenu rezultātu analīzes rīks")
 st.write("Ar šo instrumentu var aplūkot vizuāli VIIS datubāzē esošos rezultātus par centralizētajiem eksāmeniem. Ja šeit kāds eksāmens nav atrodams, tas nozīmē, ka tas **nav** bijis centralizēts - piemēram, pamatskolā daudzi eksāmeni līdz 2022. gadam netika vērtēti centralizēti.")
 st.write("Ar filtru palīdzību var atlasīt konkrētu skolu, gadu un eksāmenu, ko aplūkot. Stabiņu diagrammā varēs redzēt salīdzinājumu ar valsts vidējo rezultātu.")
 
 # =============================================================================
-# 1. Load the CSV Data from a Local File
+# 1. Load the exam data (served from a local snapshot of the VIIS CSV)
 # =============================================================================
-csv_file = "https://www.dropbox.com/scl/fi/o7j7q5hlq9i04s9tcvj8q/Web-Intelligence-1.csv?rlkey=e05vhykdwv6zrprmx1i5n4fml&dl=1"
+@st.cache_resource(show_spinner="Ielādē datus...")
+def get_refresher(source):
+    # One shared, read-only dataset (with all its indexes) for all sessions.
+    # A background thread checks the source and swaps in new versions.
+    refresher = exam_dataset.DatasetRefresher(source)
+    refresher.current()
+    refresher.start()
+    return refresher
+
 try:
-    df = pd.read_csv(csv_file)
+    # Everything below (including fragment reruns) reads this one dataset,
+    # so a refresh in the middle of a rerun cannot mix two versions.
+    dataset = get_refresher(exam_data.SOURCE).current()
 except Exception as e:
     st.error(f"Error reading the CSV file: {e}")
     st.stop()
-
-# Clean column names (remove any leading/trailing spaces)
-df.columns = df.columns.str.strip()
-
-# Filter data to include only rows for "Centralizēts eksāmens"
-df = df[df["Pārbaudījuma tips"] == "Centralizēts eksāmens"]
+df, data_version = dataset.df, dataset.version
 
 if df.empty:
     st.error("No data available for 'Centralizēts eksāmens' in the CSV file.")
     st.stop()
+timer.lap("load", rows=len(df))
+
+@st.cache_data
+def data_quality(version):
+    return exam_data.snapshot_info(version, get_refresher(exam_data.SOURCE).snapshot_dir).get("quality")
+
+QUALITY_LABELS = {
+    "missing_school": "nav skolas",
+    "missing_exam": "nav eksāmena",
+    "bad_year": "nederīgs gads",
+    "bad_grade": "nederīga klase",
+    "bad_percent": "nederīgs rezultāts",
+}
+
+# Rows that failed validation at ingest are left out of every chart.
+quality = data_quality(data_version)
+if quality and quality["quarantined"]:
+    with st.sidebar.expander("Datu kvalitāte"):
+        st.write(f"No {quality['rows']} eksāmenu rindām {quality['quarantined']} nav iekļautas analīzē:")
+        for problem, count in quality["problems"].items():
+            if count:
+                st.write(f"- {QUALITY_LABELS[problem]}: {count}")
 
 # =============================================================================
-# 2. Sidebar: Filtering Options (School, Year, School Type, Exam)
+# 2. Sidebar: School filter (year, level and exam follow in section 4)
 # =============================================================================
 st.sidebar.header("Filtri")
 
 # --- School Dropdown with Placeholder ---
-valid_schools = df["Iestādes nosaukums"].dropna().unique()
-if len(valid_schools) == 0:
+filters = dataset.filters
+if len(filters.schools) == 0:
     st.error("No school data available for 'Centralizēts eksāmens'.")
     st.stop()
 
-# Prepend a placeholder to the list of schools.
-schools_options = ["Izvēlies skolu"] + sorted(valid_schools)
-selected_school = st.sidebar.selectbox("Izvēlies skolu:", schools_options)
+# --- School search (prebuilt index; "Rigas" also finds "Rīgas") ---
+# Only the ranked matches go into the dropdown, not every school.
+query = st.sidebar.text_input("Meklēt skolu:", placeholder="piem., Rigas 3")
+with st.sidebar.expander("Filtrēt pēc atrašanās vietas"):
+    municipality_choice = st.selectbox("Pašvaldība:", ["Visas"] + filters.search.municipalities)
+    address_query = st.text_input("Adrese satur:")
+matches = filters.search.search(query, "" if municipality_choice == "Visas" else municipality_choice,
+                                address_query, limit=exam_index.SEARCH_LIMIT if query.strip() else None)
+
+# Prepend a placeholder to the matches; a typed query picks the best one.
+schools_options = ["Izvēlies skolu"] + matches
+selected_school = st.sidebar.selectbox("Izvēlies skolu:", schools_options,
+                                       index=1 if matches and query.strip() else 0)
 
 # If the placeholder is selected, display a landing page message.
 if selected_school == "Izvēlies skolu":
-    st.write("**Lūdzu, izvēlies skolu no kreisās puses, lai turpinātu analīzi.**")
-    st.stop()
-
-filtered_school = df[df["Iestādes nosaukums"] == selected_school]
-if filtered_school.empty:
-    st.error("No data available for the selected school.")
-    st.stop()
-
-# --- Year Dropdown (based on the selected school) ---
-valid_years = filtered_school["Mācību gads"].dropna().unique()
-if len(valid_years) == 0:
-    st.error("No year data available for the selected school.")
-    st.stop()
-
-years_sorted = sorted(valid_years)
-# Default to the last (highest) year in the list.
-selected_year = st.sidebar.selectbox("Izvēlies gadu:", years_sorted, index=len(years_sorted) - 1)
-filtered_year = filtered_school[filtered_school["Mācību gads"] == selected_year]
-if filtered_year.empty:
-    st.error("No data available for the selected year.")
-    st.stop()
-
-# --- School Type Filter ---
-# Define groups: "Pamatskola" includes classes 1-9, "Vidusskola" includes classes 10-12.
-school_type = st.sidebar.selectbox("Izvēlies izglītības līmeni:", ["Pamatskola", "Vidusskola"])
-
-filtered_year = filtered_year.copy()
-filtered_year["Klases pakāpe_numeric"] = pd.to_numeric(filtered_year["Klases pakāpe"], errors='coerce')
-
-if school_type == "Pamatskola":
-    filtered_group = filtered_year[filtered_year["Klases pakāpe_numeric"].between(1, 9)]
-else:  # Vidusskola
-    filtered_group = filtered_year[filtered_year["Klases pakāpe_numeric"].between(10, 12)]
-
-if filtered_group.empty:
-    st.error(f"No data available for the selected school type: {school_type}.")
-    st.stop()
-
-# --- Exam Dropdown (for the selected school, year, and school type) ---
-# Define a helper function that returns the appropriate exam name.
-def get_exam_name(row):
-    if row["Pārbaudījuma nosaukums"] == "N/D":
-        try:
-            year = int(row["Mācību gads"])
-        except:
-            year = 0
-        # For years prior to 2022, remove the prefix "Centralizētais eksāmens "
-        if year < 2022:
-            prefix = "Centralizētais eksāmens "
-            exam_subject = row["Pārbaudījuma mācību priekšmeta nosaukums"]
-            if isinstance(exam_subject, str) and exam_subject.startswith(prefix):
-                exam_subject = exam_subject[len(prefix):]
-            # Capitalize the first letter of the remaining string.
-            return exam_subject.capitalize() if isinstance(exam_subject, str) else exam_subject
-        else:
-            return row["Pārbaudījuma mācību priekšmeta nosaukums"]
+    if (query.strip() or address_query.strip() or municipality_choice != "Visas") and not matches:
+        st.write("**Neviena skola neatbilst meklējumam.**")
     else:
-        return row["Pārbaudījuma nosaukums"]
-
-filtered_group = filtered_group.copy()
-filtered_group["Exam"] = filtered_group.apply(get_exam_name, axis=1)
-
-valid_exams = filtered_group["Exam"].dropna().unique()
-if len(valid_exams) == 0:
-    st.error("No exam data available for the selected school, year, and school type.")
+        st.write("**Lūdzu, sameklē un izvēlies skolu kreisajā pusē, lai turpinātu analīzi.**")
     st.stop()
 
-selected_exam = st.sidebar.selectbox("Izvēlies eksāmenu:", sorted(valid_exams))
+timer.lap("filters")
 
 # =============================================================================
 # 3. Display the School’s Address and Map Location
 # =============================================================================
 # Use the first record for the school (address is independent of class level)
-school_info = filtered_school.iloc[0]
-address = school_info["Iestādes juridiskās adrese"]
+address = dataset.address(selected_school)
 
 # Display the header with the selected school's name.
 st.subheader(f"Izvēlētā skola: {selected_school}")
 st.write("**Adrese:**", address)
 
 @st.cache_resource
-def geocode_address(addr):
-    geolocator = Nominatim(user_agent="exam_dashboard")
-    geocode_fn = RateLimiter(geolocator.geocode, min_delay_seconds=1)
-    location = geocode_fn(addr)
-    if location:
-        return location.latitude, location.longitude
-    else:
-        return None, None
+def load_geocoder():
+    # Persistent on-disk geocode store in front of the configured geocoder
+    # (prewarm it with: python geocoding.py).
+    return geocoding.CachedGeocoder.from_env()
 
-lat, lon = geocode_address(address)
+lat, lon = load_geocoder().locate(address)
+timer.lap("geocode")
 if lat is not None and lon is not None:
     location_df = pd.DataFrame({"lat": [lat], "lon": [lon]})
     st.map(location_df)
 else:
     st.write("Nespējām automātiski atrast skolu kartē pēc tās adreses.")
+timer.lap("map")
 
 # =============================================================================
-# 4. Compute and Plot Normalized Grouped Bar Chart (School vs Country)
+# 4. Year, level and exam filters as partial reruns
 # =============================================================================
-st.subheader("Eksāmena rezultāti - skola vs. valsts vidējais")
-
-# --- School Exam Results ---
-exam_results = filtered_group[filtered_group["Exam"] == selected_exam]
-
-# Compute the total number of students (for the selected school and exam)
-total_school_count = len(exam_results)
-st.markdown(f"**Kopējais eksāmena kārtotāju skaits: {total_school_count} kārtotāji**")
-
-if exam_results.empty:
-    st.write("No exam results available for the selected school options.")
-else:
-    # Define bins: 0-5, 5-10, ..., 95-100
-    bins = list(range(0, 105, 5))
-    labels = [f"{bins[i]}-{bins[i+1]}" for i in range(len(bins) - 1)]
-
-    # Bin the school results and compute counts and normalized frequencies
-    school_bins = pd.cut(exam_results["Procenti"], bins=bins, right=False, include_lowest=True)
-    school_counts = school_bins.value_counts(sort=False)
-    school_normalized = school_counts / school_counts.sum()
-
-    # Create a DataFrame for the school group.
-    school_df = pd.DataFrame({
-        'Exam_Percentage_Bin': labels,
-        'Normalized_Frequency': school_normalized.values,
-        'Raw_Count': school_counts.values,
-        'Group': 'School'
-    })
-
-    # --- Country Exam Results ---
-    # Apply the exam naming logic on the entire dataset.
-    df_country = df.copy()
-    df_country["Exam"] = df_country.apply(get_exam_name, axis=1)
-    country_exam_results = df_country[
-        (df_country["Mācību gads"] == selected_year) &
-        (df_country["Exam"] == selected_exam)
-    ]
-
-    if country_exam_results.empty:
-        st.write("No country exam results available for the selected options.")
-        country_df = pd.DataFrame(columns=['Exam_Percentage_Bin', 'Normalized_Frequency', 'Group', 'Raw_Count'])
+# The filters below the school depend only on it, so they run as fragments:
+# a year change reruns exam_filters, a level or exam change reruns only
+# histogram_section. Neither touches the load, the address lookup or the
+# map. Fragments cannot use st.sidebar themselves, so they are called inside
+# it, and the histogram goes to a main-area placeholder made beforehand.
+histogram_area = st.empty()
+
+@st.fragment
+def exam_filters(selected_school):
+    timer = instrumentation.section_timer("scratch_20")
+
+    # --- Year Dropdown (based on the selected school) ---
+    years_sorted = filters.years(selected_school)
+    if len(years_sorted) == 0:
+        histogram_area.error("No year data available for the selected school.")
+        return
+
+    # Default to the last (highest) year in the list.
+    selected_year = st.selectbox("Izvēlies gadu:", years_sorted, index=len(years_sorted) - 1)
+    timer.lap("year")
+    histogram_section(selected_school, selected_year)
+
+@st.fragment
+def histogram_section(selected_school, selected_year):
+    timer = instrumentation.section_timer("scratch_20")
+
+    # --- School Type Filter ---
+    # Define groups: "Pamatskola" includes classes 1-9, "Vidusskola" includes classes 10-12.
+    school_type = st.selectbox("Izvēlies izglītības līmeni:", list(exam_data.GRADE_BANDS))
+
+    if filters.level_rows(selected_school, selected_year, school_type) == 0:
+        histogram_area.error(f"No data available for the selected school type: {school_type}.")
+        return
+
+    # --- Exam Dropdown (for the selected school, year, and school type) ---
+    valid_exams = filters.exams(selected_school, selected_year, school_type)
+    if len(valid_exams) == 0:
+        histogram_area.error("No exam data available for the selected school, year, and school type.")
+        return
+
+    selected_exam = st.selectbox("Izvēlies eksāmenu:", valid_exams)
+
+    # --- Comparison with other schools (picked, or all in the municipality) ---
+    others = [school for school in filters.exam_schools(selected_year, school_type, selected_exam)
+              if school != selected_school]
+    municipality = filters.municipality(selected_school)
+    whole_municipality = st.checkbox(f"Salīdzināt ar visām skolām: {municipality or 'pašvaldība nav zināma'}",
+                                     disabled=not municipality)
+    if whole_municipality:
+        neighbours = set(filters.municipality_schools(selected_school))
+        compared = [school for school in others if school in neighbours]
+    else:
+        compared = st.multiselect("Salīdzināt ar skolām:", others)
+
+    # --- Bin width (every binning is a merge of the cached 1% counts) ---
+    custom_bins = "Savi robežpunkti"
+    bin_width = st.selectbox("Intervāla platums:",
+                             [f"{width}%" for width in exam_aggregates.BIN_WIDTHS] + [custom_bins],
+                             index=exam_aggregates.BIN_WIDTHS.index(5))
+    if bin_width == custom_bins:
+        cut_points = st.text_input("Robežpunkti, %:", "0, 40, 60, 80, 100")
+        try:
+            bins = exam_aggregates.parse_bins(cut_points)
+        except ValueError as e:
+            st.error(str(e))
+            bins = exam_aggregates.BINS
     else:
-        country_bins = pd.cut(country_exam_results["Procenti"], bins=bins, right=False, include_lowest=True)
-        country_counts = country_bins.value_counts(sort=False)
-        country_normalized = country_counts / country_counts.sum()
-        country_df = pd.DataFrame({
-            'Exam_Percentage_Bin': labels,
-            'Normalized_Frequency': country_normalized.values,
-            'Raw_Count': country_counts.values,
-            'Group': 'Country'
-        })
-
-    # Combine the two dataframes.
-    combined_df = pd.concat([school_df, country_df], ignore_index=True)
-
-    # Create the grouped bar chart with enlarged fonts.
-    chart_grouped = alt.Chart(combined_df).mark_bar().encode(
-        x=alt.X('Exam_Percentage_Bin:N', title='Intervāls'),
-        xOffset=alt.X('Group:N', title=''),
-        y=alt.Y('Normalized_Frequency:Q', title='Biežums, %', axis=alt.Axis(format='%')),
-        color=alt.Color('Group:N',
-                        scale=alt.Scale(domain=['School', 'Country'],
-                                        range=['blue', 'orange'])),
-        tooltip=[
-            alt.Tooltip('Group:N', title='Grupa'),
-            alt.Tooltip('Exam_Percentage_Bin:N', title='Rezultātu intervāls, %'),
-            alt.Tooltip('Normalized_Frequency:Q', format='.2%', title='Biežums, %'),
-            alt.Tooltip('Raw_Count:Q', title='Kārtotāju skaits')
-        ]
-    ).properties(
-        width=350,
-        height=400,
-        title="Eksāmena rezultāti - skola vs. valsts vidējais"
-    ).configure_axis(
-        labelFontSize=16,
-        titleFontSize=18
-    ).configure_title(
-        fontSize=20
-    )
-
-    st.altair_chart(chart_grouped, use_container_width=True)
+        bins = exam_aggregates.width_bins(int(bin_width.rstrip("%")))
+    timer.lap("exam_filters")
+
+    with histogram_area.container():
+        st.subheader("Eksāmena rezultāti - skola vs. valsts vidējais")
+
+        # --- School Exam Results ---
+        exam_rows = filters.rows(selected_school, selected_year, school_type, selected_exam)
+
+        # Compute the total number of students (for the selected school and exam)
+        total_school_count = len(exam_rows)
+        st.markdown(f"**Kopējais eksāmena kārtotāju skaits: {total_school_count} kārtotāji**")
+
+        if total_school_count == 0:
+            st.write("No exam results available for the selected school options.")
+            return
+
+        histograms = dataset.histograms
+        country_total = histograms.country(selected_year, selected_exam).sum()
+        if country_total == 0:
+            st.write("No country exam results available for the selected options.")
+        timer.lap("histogram", rows=total_school_count)
+
+        # The serialized chart is memoized per selection and dataset version.
+        chart_col, rank_col = st.columns([3, 1])
+        chart_key = ("histogram", data_version, selected_school, selected_year, school_type, selected_exam,
+                     tuple(bins))
+        chart_cache.get_chart_cache().show(
+            chart_key,
+            lambda: exam_charts.build_histogram_chart(histograms, selected_year, selected_exam,
+                                                      selected_school, school_type, bins),
+            container=chart_col)
+        timer.lap("chart")
+
+        # --- National rank (looked up in the precomputed ranking table) ---
+        rank = dataset.rankings.school(selected_year, selected_exam, selected_school, school_type)
+        with rank_col:
+            st.markdown("**Vieta valstī**")
+            if rank is None:
+                st.write("Nav datu reitingam.")
+            else:
+                st.metric("Vieta", f"{int(rank['rank'])}. no {int(rank['schools'])}")
+                st.metric("Procentile", f"{rank['percentile']:.0f}")
+                st.metric("Vidējais rezultāts", f"{rank['mean']:.1f}%")
+                st.metric("Mediāna", f"{rank['median']:.1f}%")
+        timer.lap("rank")
+
+        # --- Summary statistics and density (from the sorted results) ---
+        distributions = dataset.distributions
+        summary = exam_charts.summary_frame(distributions, selected_year, selected_exam, selected_school, school_type)
+        st.dataframe(summary.style.format(precision=1))
+        chart_key = ("density", data_version, selected_school, selected_year, school_type, selected_exam)
+        chart_cache.get_chart_cache().show(
+            chart_key,
+            lambda: exam_charts.build_density_chart(distributions, selected_year, selected_exam,
+                                                    selected_school, school_type))
+        timer.lap("summary")
+
+        # --- Trend over all years (from the per-year aggregate table) ---
+        trends = dataset.trends
+        chart_key = ("trend", data_version, selected_school, school_type,
+                     exam_data.exam_series_name(selected_exam))
+        chart_cache.get_chart_cache().show(
+            chart_key,
+            lambda: exam_charts.build_trend_chart(trends, selected_exam, selected_school, school_type))
+        timer.lap("trend")
+
+        if compared:
+            schools = [selected_school] + compared
+            chart_key = ("comparison", data_version, selected_year, school_type, selected_exam, tuple(schools),
+                         tuple(bins))
+            chart_cache.get_chart_cache().show(
+                chart_key,
+                lambda: exam_charts.build_comparison_chart(histograms, selected_year, selected_exam,
+                                                           schools, school_type, bins=bins))
+            timer.lap("comparison", rows=len(schools))
+
+with st.sidebar:
+    exam_filters(selected_school)
@@ -0,0 +1,148 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# Synthetic VIIS exam export
+# =============================================================================
+# Produces a CSV with the same columns (and the same quirks: padded column
+# names, "N/D" exam names with prefixed subjects before 2022, non-centralized
+# rows) as the VIIS export, at any size, for benchmarks and offline testing.
+
+MUNICIPALITIES = [
+    "Rīga", "Daugavpils", "Jelgava", "Jūrmala", "Liepāja", "Rēzekne", "Valmiera",
+    "Ventspils", "Ogre", "Tukums", "Cēsis", "Sigulda", "Bauska", "Ādaži", "Talsi",
+    "Kuldīga", "Saldus", "Dobele", "Jēkabpils", "Madona", "Gulbene", "Alūksne",
+]
+SCHOOL_KINDS = ["vidusskola", "pamatskola", "ģimnāzija", "Valsts ģimnāzija"]
+STREETS = ["Brīvības iela", "Skolas iela", "Rīgas iela", "Dzirnavu iela", "Pils iela", "Parka iela"]
+
+# (subject, "in subject" form used by pre-2022 exam titles, grade).
+SUBJECTS = [
+    ("Matemātika", "matemātikā", 12), ("Latviešu valoda", "latviešu valodā", 12),
+    ("Angļu valoda", "angļu valodā", 12), ("Fizika", "fizikā", 12),
+    ("Ķīmija", "ķīmijā", 12), ("Bioloģija", "bioloģijā", 12),
+    ("Vēsture", "vēsturē", 12), ("Vācu valoda", "vācu valodā", 12),
+    ("Krievu valoda", "krievu valodā", 12), ("Ģeogrāfija", "ģeogrāfijā", 12),
+    ("Matemātika", "matemātikā", 9), ("Latviešu valoda", "latviešu valodā", 9),
+    ("Angļu valoda", "angļu valodā", 9), ("Vēsture", "vēsturē", 9),
+]
+OTHER_EXAM_TYPE = "Valsts pārbaudes darbs"
+
+COLUMNS = [
+    "Iestādes nosaukums ",
+    "Iestādes juridiskās adrese",
+    "Mācību gads",
+    "Pārbaudījuma tips",
+    "Pārbaudījuma nosaukums",
+    "Pārbaudījuma mācību priekšmeta nosaukums",
+    "Klases pakāpe",
+    "Procenti",
+]
+
+
+def make_schools(n_schools, rng):
+    """Names, addresses and an ability offset for n_schools schools."""
+    schools = []
+    for i in range(n_schools):
+        town = MUNICIPALITIES[i % len(MUNICIPALITIES)]
+        number = i // len(MUNICIPALITIES) + 1
+        kind = SCHOOL_KINDS[i % len(SCHOOL_KINDS)]
+        street = STREETS[i % len(STREETS)]
+        schools.append({
+            "name": f"{town} {number}. {kind}",
+            "address": f"{street} {number + i % 40}, {town}, LV-{1000 + i % 9000}",
+            "offset": rng.normal(0, 8),
+            "basic_only": kind == "pamatskola",
+        })
+    return schools
+
+
+def make_exams(n_exams):
+    return [SUBJECTS[i % len(SUBJECTS)] for i in range(min(n_exams, len(SUBJECTS)))]
+
+
+def exam_labels(exam, year):
+    """(Pārbaudījuma nosaukums, Pārbaudījuma mācību priekšmeta nosaukums)."""
+    subject, locative, grade = exam
+    if year < 2022:
+        return "N/D", f"Centralizētais eksāmens {locative}"
+    if grade == 12:
+        return f"{subject} (optimālais līmenis)", subject
+    return "N/D", subject
+
+
+def generate_chunk(n_rows, schools, exams, years, rng, other_share=0.05):
+    school_idx = rng.integers(len(schools), size=n_rows)
+    exam_idx = rng.integers(len(exams), size=n_rows)
+    year = rng.choice(years, size=n_rows)
+
+    # Primary schools only sit grade-9 exams.
+    basic_only = np.array([s["basic_only"] for s in schools])[school_idx]
+    exam_grades = np.array([exam[2] for exam in exams])
+    nine = np.flatnonzero(exam_grades == 9)
+    if len(nine):
+        moved = basic_only & (exam_grades[exam_idx] != 9)
+        exam_idx = np.where(moved, rng.choice(nine, size=n_rows), exam_idx)
+    grades = exam_grades[exam_idx]
+
+    # Beta-shaped results centred on an exam difficulty, shifted per school.
+    difficulty = 45 + 25 * ((exam_idx * 7919) % 10) / 10
+    offset = np.array([s["offset"] for s in schools])[school_idx]
+    mean = np.clip((difficulty + offset) / 100, 0.05, 0.95)
+    concentration = 8
+    percent = rng.beta(mean * concentration, (1 - mean) * concentration) * 100
+    percent = np.round(percent, 1)
+
+    labels = {}
+    for e, y in set(zip(exam_idx.tolist(), year.tolist())):
+        labels[e, y] = exam_labels(exams[e], y)
+    name_subject = [labels[e, y] for e, y in zip(exam_idx.tolist(), year.tolist())]
+
+    exam_type = np.where(rng.random(n_rows) < other_share, OTHER_EXAM_TYPE, "Centralizēts eksāmens")
+    return pd.DataFrame({
+        COLUMNS[0]: [schools[i]["name"] for i in school_idx],
+        COLUMNS[1]: [schools[i]["address"] for i in school_idx],
+        COLUMNS[2]: year,
+        COLUMNS[3]: exam_type,
+        COLUMNS[4]: [n for n, _ in name_subject],
+        COLUMNS[5]: [s for _, s in name_subject],
+        COLUMNS[6]: grades,
+        COLUMNS[7]: percent,
+    })
+
+
+def write_csv(path, n_rows, n_schools=800, n_years=5, n_exams=14, first_year=2019,
+              seed=0, chunk_rows=500_000):
+    """Write a synthetic export with n_rows student results to path."""
+    rng = np.random.default_rng(seed)
+    schools = make_schools(n_schools, rng)
+    exams = make_exams(n_exams)
+    years = np.arange(first_year, first_year + n_years)
+
+    tmp_path = path + ".tmp"
+    written = 0
+    with open(tmp_path, "w", encoding="utf-8", newline="") as fh:
+        while written < n_rows:
+            rows = min(chunk_rows, n_rows - written)
+            chunk = generate_chunk(rows, schools, exams, years, rng)
+            chunk.to_csv(fh, index=False, header=written == 0)
+            written += rows
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic VIIS exam CSV.")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--schools", type=int, default=800)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--exams", type=int, default=len(SUBJECTS))
+    parser.add_argument("--first-year", type=int, default=2019)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, args.schools, args.years, args.exams, args.first_year, args.seed)
+    print(f"wrote {args.rows} rows to {args.path}")